@@ -1,5 +1,16 @@
 from gpudb import GPUdb
+from gpudb import BulkInserter
+from gpudb import InsertPipeline
+from gpudb import GPUdbRetryPolicy, GPUdbHedgingPolicy
+from gpudb import GPUdbCodec, compression_codecs
+from gpudb import GPUdbException, GPUdbTransportError, GPUdbConnectionError
+from gpudb import GPUdbResponseError, GPUdbTimeoutError
 from gpudb import collections
 
+try: # AsyncGPUdb needs the optional trollius package
+    from gpudb_async import AsyncGPUdb
+except ImportError:
+    pass
+
 
 
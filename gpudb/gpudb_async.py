@@ -0,0 +1,450 @@
+# ---------------------------------------------------------------------------
+# gpudb_async.py - Asynchronous GPUdb client for trollius (asyncio) event loops.
+#
+# Every endpoint method of AsyncGPUdb returns a coroutine instead of the
+# decoded response. Requires the trollius package, the asyncio backport.
+# ---------------------------------------------------------------------------
+
+import httplib
+import time
+
+try:
+    import trollius
+    from trollius import From, Return
+except ImportError:
+    raise ImportError("AsyncGPUdb requires the trollius package (pip install trollius)")
+
+from gpudb import GPUdb
+from gpudb_transport import GPUdbTransportError, GPUdbConnectionError
+from gpudb_transport import GPUdbResponseError, GPUdbTimeoutError
+
+
+# ---------------------------------------------------------------------------
+# AsyncGPUdb - GPUdb client whose endpoint methods are coroutines.
+# ---------------------------------------------------------------------------
+
+def sync_only(name):
+    """Returns a method raising a TypeError, for helpers AsyncGPUdb lacks."""
+    def method(self, *args, **kwargs):
+        raise TypeError( "%s() reads the responses itself and needs a GPUdb client; "
+                         "AsyncGPUdb's endpoint methods return coroutines" % name )
+    method.__name__ = name
+    return method
+
+
+class AsyncGPUdb(GPUdb):
+    """
+    A GPUdb client for trollius event loops. The endpoint methods (filter,
+    get_records, insert_records, aggregate_*, visualize_image, ...) take the
+    same arguments as GPUdb's but return coroutines of the decoded response:
+
+        db = AsyncGPUdb(host="127.0.0.1", port="9191")
+        response = yield From(db.get_records("table", 0, 100))
+
+    So do the helpers that return an endpoint's response, such as add_point
+    and the bulk_add_* methods. Helpers that read responses themselves,
+    insert_rows, insert_records_stream, get_table_type_schema, iter_records
+    and export_table, raise a TypeError, as do BulkInserter and
+    InsertPipeline; use a GPUdb client for them.
+
+    Requests are sent over non-blocking keep-alive HTTP/1.1 connections,
+    reused between requests, with at most max_connections open at a time;
+    further concurrent requests wait for a free connection. Like GPUdb,
+    requests are spread over the head nodes and fail over, are retried by
+    the retry policy, time out, are hedged and use the metadata cache. The
+    request_options() in effect when an endpoint method is called apply to
+    its coroutine.
+    """
+
+    is_async = True
+
+    def __init__(self, host="127.0.0.1", port="9191",
+                       encoding="BINARY", connection='HTTP',
+                       username="", password="",
+                       max_connections=100, pool_idle_timeout=60.0,
+                       validate=True, loop=None, metadata_cache_ttl=None,
+                       balance="round_robin", host_cooldown=30.0,
+                       connect_timeout=10.0, read_timeout=None, retry_policy=None,
+                       hedging=None, compression=None, compression_threshold=1024,
+                       write_failover=False):
+        """
+        Construct a new AsyncGPUdb client instance.
+
+        Parameters:
+            host, port, encoding, connection, username, password, validate,
+            metadata_cache_ttl, balance, host_cooldown, connect_timeout,
+            read_timeout, retry_policy, hedging, compression,
+            compression_threshold, write_failover :
+                         As for GPUdb.
+            max_connections   : Maximum number of connections open at once.
+            pool_idle_timeout : Seconds before an idle connection is closed.
+            loop       : The trollius event loop, None for the current one.
+        """
+        GPUdb.__init__(self, host, port, encoding, connection, username, password,
+                       pool_idle_timeout=pool_idle_timeout, validate=validate,
+                       metadata_cache_ttl=metadata_cache_ttl, balance=balance,
+                       host_cooldown=host_cooldown, connect_timeout=connect_timeout,
+                       read_timeout=read_timeout, retry_policy=retry_policy,
+                       hedging=hedging, compression=compression,
+                       compression_threshold=compression_threshold,
+                       write_failover=write_failover)
+
+        if loop is None:
+            loop = trollius.get_event_loop()
+
+        self.loop = loop
+        self.max_connections = max_connections
+        self.idle_timeout = pool_idle_timeout
+        self.connection_slots = trollius.Semaphore(max_connections, loop=loop)
+        self.idle_streams = {} # (host, port, scheme) -> [ (reader, writer, last_used), ... ]
+
+        self.hits = 0       # Requests sent on a reused connection
+        self.misses = 0     # Requests that opened a new connection
+        self.reconnects = 0 # Reused connections found closed by the server
+    # end __init__
+
+    # Helpers that need the decoded responses of their own requests
+    insert_rows           = sync_only("insert_rows")
+    insert_records_stream = sync_only("insert_records_stream")
+    get_table_type_schema = sync_only("get_table_type_schema")
+    iter_records          = sync_only("iter_records")
+    export_table          = sync_only("export_table")
+
+    def post_then_get(self, REQ_SCHEMA, REP_SCHEMA, datum, endpoint):
+        """
+        Returns a coroutine that encodes the datum dict using the REQ_SCHEMA,
+        POSTs it to the GPUdb server and decodes the reply using the
+        REP_SCHEMA. The request options are taken when this is called.
+
+        Parameters:
+            REQ_SCHEMA : The parsed schema from avro.schema.parse() of the request.
+            REP_SCHEMA : The parsed schema from avro.schema.parse() of the reply.
+            datum      : Request dict matching the REQ_SCHEMA.
+            endpoint   : Server path to POST to, e.g. "/add".
+        """
+        # The coroutine may first run after the caller's request_options()
+        options = dict([ (name, self.get_request_option(name))
+                         for name in self.request_option_names ])
+        return self.post_then_get_async(REQ_SCHEMA, REP_SCHEMA, datum, endpoint, options)
+
+    @trollius.coroutine
+    def post_then_get_async(self, REQ_SCHEMA, REP_SCHEMA, datum, endpoint, options):
+        """Coroutine of post_then_get(), options is a dict of the request options."""
+        encoded_datum = self.write_datum(REQ_SCHEMA, datum)
+
+        cache_key,out = self.get_cached_metadata(endpoint, datum, encoded_datum)
+        if out is not None:
+            raise Return(out)
+
+        response,response_time = yield From(self.post_async(encoded_datum, endpoint, options))
+        out = self.read_datum(REP_SCHEMA, response, None, response_time)
+
+        raise Return(self.update_metadata(endpoint, datum, cache_key, out))
+
+    @trollius.coroutine
+    def post_async(self, body_data, endpoint, options):
+        """
+        Coroutine counterpart of GPUdb.post_to_gpudb_read(): chooses the
+        head node, fails over, retries and hedges the request as GPUdb does
+        and returns the response body and its x-request-time-secs.
+
+        Parameters:
+            body_data : Data to POST to GPUdb server.
+            endpoint  : Server path to POST to, e.g. "/add".
+            options   : Dict of the request options, see request_options().
+        """
+        headers,body_data = self.request_headers(body_data)
+
+        manager = self.host_manager
+        policy = options["retry_policy"]
+        read_only = endpoint.startswith(self.read_only_endpoint_prefixes)
+        attempt = 1
+        tried = []
+
+        hedging = options["hedging"]
+        if (hedging is not None) and not policy.is_idempotent(endpoint):
+            hedging = None
+
+        while True:
+            host = manager.acquire(read_only, tried)
+            tried.append(host)
+            host_ok = True
+
+            try:
+                hedge_delay = None
+                if hedging is not None:
+                    hedge_delay = hedging.get_delay(endpoint)
+
+                if hedge_delay is not None:
+                    resp_headers,resp_data,host_ok = yield From(self.send_hedged_request_async(
+                        endpoint, body_data, headers, host, read_only, hedging, hedge_delay, options))
+                else:
+                    start_time = time.time()
+                    resp_headers,resp_data = yield From(self.send_request_async(
+                        host.url_path + endpoint, body_data, headers, host, options))
+                    if hedging is not None:
+                        hedging.record(endpoint, time.time() - start_time)
+            except GPUdbTransportError, e:
+                manager.release(host, False)
+                e.attempts = attempt
+                if not policy.can_retry(e, endpoint):
+                    raise
+                if len(tried) < len(manager.get_candidates(read_only)):
+                    continue # fail over to another head node right away
+                if attempt >= policy.max_attempts:
+                    raise
+                yield From(trollius.sleep(policy.get_delay(attempt), loop=self.loop))
+                attempt += 1
+                tried = []
+                continue
+            except:
+                manager.release(host, True)
+                raise
+
+            manager.release(host, host_ok)
+            break
+
+        resp_time = resp_headers.get('x-request-time-secs', None)
+        resp_data = self.decompress_response(resp_headers.get('content-encoding', None), resp_data)
+
+        raise Return((resp_data, resp_time))
+    # end post_async
+
+    @trollius.coroutine
+    def send_hedged_request_async(self, endpoint, body_data, headers, host, read_only,
+                                  hedging, hedge_delay, options):
+        """
+        Coroutine counterpart of GPUdb.send_hedged_request(): sends the
+        request to host and, if it is not answered within hedge_delay
+        seconds, a copy of it as GPUdbHostManager.acquire_hedge() chooses.
+        Returns the first response headers and body and whether the request
+        to host succeeded; the other request is cancelled. If both fail, the
+        error of the request to host is raised.
+        """
+        manager = self.host_manager
+
+        def start(to_host):
+            task = trollius.ensure_future(self.send_request_async(
+                to_host.url_path + endpoint, body_data, headers, to_host, options), loop=self.loop)
+            start_times[task] = time.time()
+            return task
+
+        def failed(task):
+            return task.done() and not task.cancelled() and (task.exception() is not None)
+
+        start_times = {}
+        first = start(host)
+        hedge = None
+        hedge_host = None
+        running = set([first])
+        winner = None
+
+        try:
+            while (winner is None) and (len(running) > 0):
+                done,running = yield From(trollius.wait(
+                    running, timeout=(hedge_delay if hedge is None else None),
+                    return_when=trollius.FIRST_COMPLETED, loop=self.loop))
+                if len(done) == 0: # not answered in time, send the copy
+                    hedge_host = manager.acquire_hedge(host, read_only)
+                    hedge = start(hedge_host)
+                    running.add(hedge)
+                    continue
+                for task in done:
+                    if not failed(task):
+                        winner = task
+                        break
+                # if one copy failed, wait for the other
+        except: # this coroutine was cancelled
+            for task in running:
+                task.cancel()
+            if hedge is not None:
+                manager.release(hedge_host, True)
+            raise
+
+        for task in running:
+            task.cancel()
+        if len(running) > 0: # let the cancelled copy close its connection
+            yield From(trollius.wait(running, loop=self.loop))
+
+        if hedge is not None:
+            manager.release(hedge_host, not failed(hedge))
+            hedging.count_hedge(winner is hedge)
+
+        if winner is None:
+            raise first.exception()
+
+        # The latency of the copy that answered, not counting the wait before
+        # the hedge, so that hedging does not raise the delay
+        hedging.record(endpoint, time.time() - start_times[winner])
+
+        resp_headers,resp_data = winner.result()
+        raise Return((resp_headers, resp_data, not failed(first)))
+    # end send_hedged_request_async
+
+    @trollius.coroutine
+    def send_request_async(self, url, body_data, headers, host, options):
+        """
+        Coroutine that POSTs to host over a reused or new connection and
+        returns the response headers, with lower case names, and body.
+        A reused connection that the server has since closed is dropped and
+        the request sent on a new one, unless it may have reached the server
+        already and its endpoint is not idempotent (see GPUdbRetryPolicy).
+
+        Parameters:
+            url       : Full server path to POST to, e.g. "/path/add".
+            body_data : Data to POST to GPUdb server.
+            headers   : Dict of HTTP headers.
+            host      : The GPUdbHost to send to.
+            options   : Dict of the request options, see request_options().
+        """
+        request = self.format_request(url, body_data, host.authorize(headers), host)
+        policy = options["retry_policy"]
+        read_timeout = options["read_timeout"]
+        address = "%s:%d" % (host.host, host.port)
+
+        yield From(self.connection_slots.acquire())
+        try:
+            while True:
+                reader,writer,reused = yield From(self.open_stream(host, url, options["connect_timeout"]))
+
+                try:
+                    writer.write(request)
+                    yield From(writer.drain())
+                except EnvironmentError, e:
+                    writer.close()
+                    if reused:
+                        self.reconnects += 1
+                        continue # stale keep-alive socket, retry on a new one
+                    raise GPUdbConnectionError( "Error posting to %s%s: %s" % (address, url, e),
+                                                address, url )
+                except:
+                    writer.close()
+                    raise
+
+                try:
+                    resp_headers,resp_data,will_close = yield From(trollius.wait_for(
+                        self.read_response(reader), read_timeout, loop=self.loop))
+                except trollius.TimeoutError:
+                    writer.close()
+                    raise GPUdbTimeoutError( "Timeout Error: No response received from %s within %s seconds" %
+                                             (address, read_timeout), address, url )
+                except (EnvironmentError, EOFError, httplib.HTTPException), e:
+                    writer.close()
+                    # The server may have applied the request before closing
+                    if reused and policy.is_idempotent(url[len(host.url_path):]):
+                        self.reconnects += 1
+                        continue
+                    raise GPUdbResponseError( "No response received from %s: %s" % (address, e),
+                                              address, url )
+                except:
+                    writer.close()
+                    raise
+
+                if will_close:
+                    writer.close()
+                else:
+                    key = (host.host, host.port, host.connection)
+                    self.idle_streams.setdefault(key, []).append((reader, writer, time.time()))
+
+                raise Return((resp_headers, resp_data))
+        finally:
+            self.connection_slots.release()
+    # end send_request_async
+
+    @trollius.coroutine
+    def open_stream(self, host, url, connect_timeout):
+        """Coroutine returning (reader, writer, reused) for an open connection to host."""
+        now = time.time()
+        streams = self.idle_streams.get((host.host, host.port, host.connection), [])
+        while len(streams) > 0:
+            reader,writer,last_used = streams.pop() # most recently used
+            if (now - last_used < self.idle_timeout) and not reader.at_eof():
+                self.hits += 1
+                raise Return((reader, writer, True))
+            writer.close()
+
+        self.misses += 1
+        address = "%s:%d" % (host.host, host.port)
+        try:
+            reader,writer = yield From(trollius.wait_for(trollius.open_connection(
+                host.host, host.port, ssl=(host.connection == 'HTTPS'), loop=self.loop),
+                connect_timeout, loop=self.loop))
+        except (EnvironmentError, trollius.TimeoutError), e:
+            raise GPUdbConnectionError( "Error connecting to %s: %s" % (address, str(e) or "timed out"),
+                                        address, url )
+        raise Return((reader, writer, False))
+
+    def format_request(self, url, body_data, headers, host):
+        """Returns the bytes of an HTTP/1.1 POST request to host."""
+        lines = [ "POST %s HTTP/1.1" % url,
+                  "Host: %s:%d" % (host.host, host.port),
+                  "Content-Length: %d" % len(body_data) ]
+        for name,value in headers.items():
+            lines.append("%s: %s" % (name, value))
+
+        return "\r\n".join(lines) + "\r\n\r\n" + body_data
+
+    @trollius.coroutine
+    def read_response(self, reader):
+        """
+        Coroutine reading an HTTP/1.1 response, returns the headers, body and
+        whether the server will close the connection.
+        """
+        status_line = yield From(reader.readline())
+        if not status_line:
+            raise httplib.BadStatusLine(status_line)
+        version = status_line.split(None, 1)[0]
+
+        resp_headers = {}
+        while True:
+            line = yield From(reader.readline())
+            if line in ("\r\n", "\n", ""):
+                break
+            name,sep,value = line.partition(":")
+            resp_headers[name.strip().lower()] = value.strip()
+
+        connection = resp_headers.get("connection", "").lower()
+        will_close = (connection == "close") or \
+                     ((version == "HTTP/1.0") and (connection != "keep-alive"))
+
+        if resp_headers.get("transfer-encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                line = yield From(reader.readline())
+                size = int(line.split(";", 1)[0].strip(), 16)
+                if size == 0:
+                    break
+                chunk = yield From(reader.readexactly(size))
+                chunks.append(chunk)
+                yield From(reader.readexactly(2)) # chunk's CRLF
+            while True: # skip any trailers
+                line = yield From(reader.readline())
+                if line in ("\r\n", "\n", ""):
+                    break
+            resp_data = "".join(chunks)
+        elif "content-length" in resp_headers:
+            resp_data = yield From(reader.readexactly(int(resp_headers["content-length"])))
+        else: # the body ends when the server closes the connection
+            resp_data = yield From(reader.read())
+            will_close = True
+
+        raise Return((resp_headers, resp_data, will_close))
+    # end read_response
+
+    def get_pool_stats(self):
+        """Returns a dict of the connection hit, miss and reconnect counters."""
+        requests = self.hits + self.misses
+        return { "hits"       : self.hits,
+                 "misses"     : self.misses,
+                 "reconnects" : self.reconnects,
+                 "hit_rate"   : (float(self.hits) / requests) if requests else 0.0,
+                 "idle"       : sum([len(s) for s in self.idle_streams.values()]) }
+
+    def close(self):
+        """Close the idle connections."""
+        idle_streams, self.idle_streams = self.idle_streams, {}
+        for streams in idle_streams.values():
+            for reader,writer,last_used in streams:
+                writer.close()
+
+# end class AsyncGPUdb
@@ -0,0 +1,472 @@
+#!/usr/bin/python
+
+# ######################################################
+#
+# Client-side micro-benchmarks for the GPUdb python API.
+# None of these need a running GPUdb server.
+#
+# @file gpudb_benchmark.py
+# ######################################################
+
+
+
+from gpudb import GPUdb
+from gpudb import collections
+import cStringIO
+import sys
+import os
+import gc
+import getopt
+import time
+
+from avro import io, schema
+
+have_numpy = False
+try:
+    import numpy
+    import gpudb_numpy
+    have_numpy = True
+except ImportError:
+    have_numpy = False
+
+
+
+
+helpMessage = """Usage:
+  -n ### -- Number of records to encode/decode (default is 100000)
+  -h -- Print this help message
+"""
+
+
+def make_big_points( num_records ):
+    """
+    Build a list of big_point datums to encode.
+    Argument:
+      num_records -- Number of datums to build
+    """
+    datums = []
+    for i in range( num_records ):
+        datum = collections.OrderedDict()
+        datum["msg_id"] = "msg_%d" % i
+        datum["x"] = i * 0.5
+        datum["y"] = i * -0.25
+        datum["TIMESTAMP"] = 1400000000.0 + i
+        datum["source"] = "benchmark"
+        datum["group_id"] = "group_%d" % (i % 10)
+        datum["OBJECT_ID"] = ""
+        datums.append( datum )
+    return datums
+
+
+def report( label, num_records, seconds, unit = "records" ):
+    print "  %-40s %8.3f s  %12.0f %s/s" % (label, seconds, num_records / max(seconds, 1e-9), unit)
+
+
+def benchmark_compiled_codecs( num_records ):
+    """
+    Compare the generic DatumWriter/DatumReader dispatch with the compiled
+    per-schema writer and reader on big_point_schema.
+    Argument:
+      num_records -- Number of records to encode and decode
+    """
+    SCHEMA = GPUdb.big_point_schema
+    datums = make_big_points( num_records )
+
+    print "Compiled codecs on big_point_schema (%d records):" % num_records
+
+    writer = io.DatumWriter( SCHEMA )
+    start = time.time()
+    generic_encoded = []
+    for datum in datums:
+        output = cStringIO.StringIO()
+        writer.write_data( SCHEMA, datum, io.BinaryEncoder( output ) )
+        generic_encoded.append( output.getvalue() )
+    report( "encode, generic DatumWriter", num_records, time.time() - start )
+
+    write = io.compile_writer( SCHEMA )
+    start = time.time()
+    compiled_encoded = []
+    for datum in datums:
+        output = cStringIO.StringIO()
+        write( datum, io.BinaryEncoder( output ) )
+        compiled_encoded.append( output.getvalue() )
+    report( "encode, compiled writer", num_records, time.time() - start )
+
+    assert generic_encoded == compiled_encoded, "Compiled writer output differs"
+
+    reader = io.DatumReader( SCHEMA )
+    start = time.time()
+    generic_decoded = [ reader.read( io.BinaryDecoder( cStringIO.StringIO( e ) ) )
+                        for e in generic_encoded ]
+    report( "decode, generic DatumReader", num_records, time.time() - start )
+
+    read = io.compile_reader( SCHEMA )
+    start = time.time()
+    compiled_decoded = [ read( io.BinaryDecoder( cStringIO.StringIO( e ) ) )
+                         for e in generic_encoded ]
+    report( "decode, compiled reader", num_records, time.time() - start )
+
+    assert generic_decoded == compiled_decoded, "Compiled reader output differs"
+
+
+def same_values( left, right ):
+    """Compare decoded values bit for bit, so NaNs and -0.0 must match too."""
+    return repr( left ) == repr( right )
+
+
+def benchmark_buffer_decoder( num_records ):
+    """
+    Compare the stream BinaryDecoder with the in-memory BinaryBufferDecoder,
+    for an aggregate_histogram response of doubles and for big_point records.
+    Argument:
+      num_records -- Number of histogram bins and of records to decode
+    """
+    gpudb = GPUdb()
+    (REQ_SCHEMA, RSP_SCHEMA) = gpudb.get_schemas( "aggregate_histogram" )
+
+    response = collections.OrderedDict()
+    response["counts"] = [ float(i % 1000) * 1.5 for i in range( num_records ) ]
+    response["counts"][:4] = [ float('nan'), float('inf'), -0.0, 1e-310 ]
+    response["start"] = 0.0
+    response["end"] = float( num_records )
+    encoded = gpudb.write_datum( RSP_SCHEMA, response )
+
+    print "Buffer decoder (%d histogram bins, %d records):" % (num_records, num_records)
+
+    reader = io.DatumReader( RSP_SCHEMA )
+    start = time.time()
+    stream_decoded = reader.read( io.BinaryDecoder( cStringIO.StringIO( encoded ) ) )
+    report( "histogram, BinaryDecoder", num_records, time.time() - start )
+
+    read = io.compile_reader( RSP_SCHEMA )
+    start = time.time()
+    buffer_decoded = read( io.BinaryBufferDecoder( encoded ) )
+    report( "histogram, BinaryBufferDecoder", num_records, time.time() - start )
+
+    assert same_values( stream_decoded, buffer_decoded ), "Buffer decoder output differs"
+
+    SCHEMA = GPUdb.big_point_schema
+    encoded = [ gpudb.write_datum( SCHEMA, datum ) for datum in make_big_points( num_records ) ]
+    read = io.compile_reader( SCHEMA )
+
+    start = time.time()
+    stream_decoded = [ read( io.BinaryDecoder( cStringIO.StringIO( e ) ) ) for e in encoded ]
+    report( "big_point, BinaryDecoder", num_records, time.time() - start )
+
+    start = time.time()
+    buffer_decoded = [ read( io.BinaryBufferDecoder( e ) ) for e in encoded ]
+    report( "big_point, BinaryBufferDecoder", num_records, time.time() - start )
+
+    assert same_values( stream_decoded, buffer_decoded ), "Buffer decoder output differs"
+
+
+def benchmark_buffer_encoder( num_records ):
+    """
+    Measure big_point records encoded per second through the StringIO backed
+    BinaryEncoder and the bytearray backed BinaryBufferEncoder, as for the
+    list of a bulk_add_big_point batch.
+    Argument:
+      num_records -- Number of records to encode
+    """
+    SCHEMA = GPUdb.big_point_schema
+    datums = make_big_points( num_records )
+    write = io.compile_writer( SCHEMA )
+
+    print "Buffer encoder on big_point_schema (%d records):" % num_records
+
+    start = time.time()
+    stream_encoded = []
+    for datum in datums:
+        output = cStringIO.StringIO()
+        write( datum, io.BinaryEncoder( output ) )
+        stream_encoded.append( output.getvalue() )
+    report( "encode, BinaryEncoder", num_records, time.time() - start )
+
+    start = time.time()
+    buffer_encoded = []
+    for datum in datums:
+        be = io.BinaryBufferEncoder()
+        write( datum, be )
+        buffer_encoded.append( be.getvalue() )
+    report( "encode, BinaryBufferEncoder", num_records, time.time() - start )
+
+    assert stream_encoded == buffer_encoded, "Buffer encoder output differs"
+
+    start = time.time()
+    be = io.BinaryBufferEncoder()
+    reused_encoded = []
+    for datum in datums:
+        be.truncate( 0 )
+        write( datum, be )
+        reused_encoded.append( be.getvalue() )
+    report( "encode, reused BinaryBufferEncoder", num_records, time.time() - start )
+
+    assert stream_encoded == reused_encoded, "Buffer encoder output differs"
+
+
+def benchmark_client_startup( num_clients ):
+    """
+    Measure GPUdb client construction, now that the endpoint schemas are
+    parsed on first use, against parsing every endpoint schema up front as
+    each client construction used to.
+    Argument:
+      num_clients -- Number of clients to construct
+    """
+    print "Client startup (%d clients):" % num_clients
+
+    # The shared schema table is built by the first client in the process
+    GPUdb.shared_gpudb_schemas = None
+    start = time.time()
+    gpudb = GPUdb()
+    report( "first client, lazy schemas", 1, time.time() - start, "clients" )
+
+    start = time.time()
+    for i in range( num_clients ):
+        GPUdb()
+    report( "each client, lazy schemas", num_clients, time.time() - start, "clients" )
+
+    start = time.time()
+    for i in range( num_clients ):
+        for entry in gpudb.gpudb_schemas.values():
+            for key in ("REQ_SCHEMA_STR", "RSP_SCHEMA_STR"):
+                if key in entry:
+                    schema.parse( entry[ key ] )
+    report( "each client, eager schema parsing", num_clients, time.time() - start, "clients" )
+
+
+def benchmark_schema_cache( num_responses ):
+    """
+    Measure decoding the same small dynamic schema response repeatedly,
+    parsing its response_schema_str every time as parse_dynamic_response
+    used to, and through the shared schema.parse_cached() cache.
+    Argument:
+      num_responses -- Number of responses to decode
+    """
+    response_schema_str = """{"type":"record","name":"generic_response","fields":[
+        {"name":"column_1","type":{"type":"array","items":"string"}},
+        {"name":"column_2","type":{"type":"array","items":"double"}},
+        {"name":"column_headers","type":{"type":"array","items":"string"}}]}"""
+    response = collections.OrderedDict()
+    response["column_1"] = [ u"group_%d" % i for i in range( 10 ) ]
+    response["column_2"] = [ float( i ) for i in range( 10 ) ]
+    response["column_headers"] = [ u"group_id", u"count" ]
+    be = io.BinaryBufferEncoder()
+    io.compile_writer( schema.parse( response_schema_str ) )( response, be )
+    encoded = be.getvalue()
+
+    print "Schema cache (%d aggregate_group_by sized responses):" % num_responses
+
+    start = time.time()
+    for i in range( num_responses ):
+        io.compile_reader( schema.parse( response_schema_str ) )( io.BinaryBufferDecoder( encoded ) )
+    report( "decode, schema.parse per response", num_responses, time.time() - start, "responses" )
+
+    start = time.time()
+    for i in range( num_responses ):
+        io.compile_reader( schema.parse_cached( response_schema_str ) )( io.BinaryBufferDecoder( encoded ) )
+    report( "decode, schema.parse_cached", num_responses, time.time() - start, "responses" )
+
+
+def current_rss():
+    """Returns the resident set size of this process in bytes (Linux only)."""
+    try:
+        with open( "/proc/self/statm" ) as statm:
+            return int( statm.read().split()[1] ) * os.sysconf( "SC_PAGE_SIZE" )
+    except (IOError, OSError, ValueError):
+        return 0
+
+
+def measure_in_child( function ):
+    """
+    Call function() in a forked child process, so that its RSS growth is
+    not skewed by what this process already holds or has freed, and return
+    the seconds it took and the growth in bytes of holding its result. On
+    platforms without fork it is called in this process instead.
+    Argument:
+      function -- Callable building the data to hold
+    """
+    if not hasattr( os, "fork" ):
+        gc.collect()
+        rss = current_rss()
+        start = time.time()
+        result = function()
+        seconds = time.time() - start
+        growth = current_rss() - rss
+        del result
+        return seconds,growth
+
+    read_fd,write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0: # the child
+        status = 1
+        try:
+            os.close( read_fd )
+            gc.collect()
+            rss = current_rss()
+            start = time.time()
+            result = function()
+            seconds = time.time() - start
+            os.write( write_fd, "%r %d" % (seconds, current_rss() - rss) )
+            status = 0
+        finally:
+            os._exit( status )
+
+    os.close( write_fd )
+    output = os.read( read_fd, 256 )
+    os.close( read_fd )
+    os.waitpid( pid, 0 )
+    seconds,growth = output.split()
+    return float( seconds ),int( growth )
+
+
+def benchmark_record_memory( num_records ):
+    """
+    Measure the bytes per decoded big_point row held in memory, decoding
+    into OrderedDicts and into __slots__ record objects, from the RSS
+    growth of holding num_records decoded rows.
+    Argument:
+      num_records -- Number of records to decode and hold
+    """
+    SCHEMA = GPUdb.big_point_schema
+    encoded = GPUdb().write_datum( SCHEMA, make_big_points( 1 )[0] )
+
+    print "Record memory on big_point_schema (%d records):" % num_records
+
+    for label,slots in (("OrderedDict", False), ("__slots__ record", True)):
+        read = io.compile_reader( SCHEMA, slots )
+        gc.collect()
+        rss = current_rss()
+        start = time.time()
+        records = [ read( io.BinaryBufferDecoder( encoded ) ) for i in xrange( num_records ) ]
+        seconds = time.time() - start
+        growth = current_rss() - rss
+        report( "decode into " + label, num_records, seconds )
+        print "  %-40s %8.0f bytes/row" % ("held as " + label, float( growth ) / num_records)
+        del records
+
+
+def benchmark_numpy_columns( num_records ):
+    """
+    Compare decoding a get_records_by_column style dynamic response into
+    lists against decoding it into NumPy arrays, in time and in the RSS
+    growth from holding the decoded columns.
+    Argument:
+      num_records -- Number of rows in the response
+    """
+    if not have_numpy:
+        print "NumPy columns: skipped, numpy is not installed"
+        return
+
+    response_schema_str = """{"type":"record","name":"generic_response","fields":[
+        {"name":"column_1","type":{"type":"array","items":"double"}},
+        {"name":"column_2","type":{"type":"array","items":"long"}},
+        {"name":"column_3","type":{"type":"array","items":"int"}},
+        {"name":"column_4","type":{"type":"array","items":"string"}},
+        {"name":"column_headers","type":{"type":"array","items":"string"}}]}"""
+    response = collections.OrderedDict()
+    response["column_1"] = [ i * 0.5 for i in range( num_records ) ]
+    response["column_2"] = [ i * i * 7919 - 10 ** 12 for i in range( num_records ) ]
+    response["column_3"] = [ i % 1000 - 500 for i in range( num_records ) ]
+    response["column_4"] = [ u"group_%d" % (i % 100) for i in range( num_records ) ]
+    response["column_headers"] = [ u"x", u"id", u"offset", u"group_id" ]
+
+    be = io.BinaryBufferEncoder()
+    io.compile_writer( schema.parse( response_schema_str ) )( response, be )
+    retobj = { "status_info" : { "status" : "OK" },
+               "response_schema_str" : response_schema_str,
+               "binary_encoded_response" : be.getvalue(),
+               "json_encoded_response" : "" }
+    gpudb = GPUdb()
+
+    print "NumPy columns (%d rows, 4 columns):" % num_records
+
+    # Each path is measured in its own process, as the memory of one would
+    # otherwise still be held, or kept by the allocator, while measuring the other
+    for label,as_numpy in (("lists", False), ("numpy arrays", True)):
+        decode = lambda: gpudb.parse_dynamic_response( dict( retobj ), as_numpy = as_numpy )[ "response" ]
+        seconds,growth = measure_in_child( decode )
+        report( "decode into " + label, num_records, seconds, "rows" )
+        print "  %-40s %8.1f MB" % ("RSS growth holding " + label, growth / 1e6)
+
+    lists = gpudb.parse_dynamic_response( dict( retobj ), as_numpy = False )[ "response" ]
+    arrays = gpudb.parse_dynamic_response( dict( retobj ), as_numpy = True )[ "response" ]
+    for name,column in lists.items():
+        assert list( arrays[ name ] ) == column, "NumPy column %s differs" % name
+
+
+def benchmark_numpy_bulk_add( num_records ):
+    """
+    Compare encoding big_point records for insert_records one OrderedDict
+    at a time, as bulk_add_big_point does, against the column-wise
+    encoding that bulk_add_big_point_arrays does.
+    Argument:
+      num_records -- Number of records to encode
+    """
+    if not have_numpy:
+        print "NumPy bulk add: skipped, numpy is not installed"
+        return
+
+    gpudb = GPUdb()
+    SCHEMA = GPUdb.big_point_schema
+    datums = make_big_points( num_records )
+
+    print "NumPy bulk add on big_point_schema (%d records):" % num_records
+
+    start = time.time()
+    row_encoded = []
+    for datum in datums:
+        row = collections.OrderedDict()
+        for name in datum:
+            row[ name ] = datum[ name ]
+        row_encoded.append( gpudb.write_datum( SCHEMA, row ) )
+    report( "encode, OrderedDict per record", num_records, time.time() - start )
+
+    columns = {}
+    for field in SCHEMA.fields:
+        columns[ field.name ] = [ datum[ field.name ] for datum in datums ]
+    for name in ("x", "y", "TIMESTAMP"):
+        columns[ name ] = numpy.array( columns[ name ] )
+
+    start = time.time()
+    column_encoded = gpudb_numpy.write_columns( SCHEMA, columns )
+    report( "encode, NumPy columns", num_records, time.time() - start )
+
+    assert row_encoded == column_encoded, "NumPy column encoding differs"
+
+
+def run_benchmarks( argv ):
+    """
+    Run all the client-side benchmarks
+    Argument:
+      argv -- Command line arguments
+    """
+    try: # Parse the command line arguments
+        opts, args = getopt.getopt( argv[1:], "hn:" )
+    except getopt.GetoptError:
+        print helpMessage
+        sys.exit( 2 )
+
+    num_records = 100000
+
+    for opt, arg in opts:
+        if opt == '-h': # print usage and exit
+            print helpMessage
+            sys.exit()
+        if opt == '-n':
+            num_records = int( arg )
+
+    benchmark_compiled_codecs( num_records )
+    benchmark_buffer_decoder( num_records )
+    benchmark_buffer_encoder( num_records )
+    benchmark_client_startup( max( num_records / 1000, 1 ) )
+    benchmark_schema_cache( max( num_records / 10, 1 ) )
+    benchmark_record_memory( num_records )
+    benchmark_numpy_columns( num_records * 10 )
+    benchmark_numpy_bulk_add( num_records )
+
+# end run_benchmarks
+
+
+
+if __name__ == "__main__":
+    run_benchmarks( sys.argv )
@@ -0,0 +1,156 @@
+# ---------------------------------------------------------------------------
+# gpudb_cache.py - Endpoint schema and metadata caches of the GPUdb client.
+# ---------------------------------------------------------------------------
+
+import sys
+import threading
+import time
+
+from avro import schema
+
+if sys.version_info >= (2, 7):
+    import collections
+else:
+    import ordereddict as collections # a separate package
+
+
+# ---------------------------------------------------------------------------
+# GPUdbSchemaEntry - An endpoint's schemas, parsed on first use.
+# ---------------------------------------------------------------------------
+
+gpudb_schemas_lock = threading.Lock() # Guards the shared endpoint schema table.
+
+class GPUdbSchemaEntry(dict):
+    """
+    The request and response schema strings of one endpoint, keyed by
+    "REQ_SCHEMA_STR" and "RSP_SCHEMA_STR". Looking up "REQ_SCHEMA" or
+    "RSP_SCHEMA" parses the string once and keeps the parsed schema.
+    """
+
+    def __missing__(self, key):
+        if (key not in ("REQ_SCHEMA", "RSP_SCHEMA")) or ((key + "_STR") not in self):
+            raise KeyError(key)
+
+        with gpudb_schemas_lock:
+            if key not in self:
+                self[key] = schema.parse(self[key + "_STR"])
+            return dict.__getitem__(self, key)
+
+# end class GPUdbSchemaEntry
+
+
+# ---------------------------------------------------------------------------
+# GPUdbMetadataCache - TTL cache of table and type metadata responses.
+# ---------------------------------------------------------------------------
+
+class GPUdbMetadataCache:
+    """
+    Caches has_table, show_table and show_types responses for ttl seconds,
+    keyed by endpoint and encoded request, i.e. by table name or type_id and
+    options. show_table with "get_sizes" is not cached since the sizes
+    change with every insert. The type_schemas of cached responses are also
+    parsed, through schema.parse_cached(), into the "type_schema_objects"
+    list.
+    """
+
+    cached_endpoints = ('/has/table', '/show/table', '/show/types')
+
+    def __init__(self, ttl):
+        """
+        Parameters:
+            ttl : Seconds a cached response stays valid.
+        """
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        # (endpoint, encoded request) -> [expires, response, table names, has collection]
+        self.entries = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def is_cacheable(self, endpoint, datum):
+        if endpoint not in self.cached_endpoints:
+            return False
+        if (endpoint == '/show/table') and (datum['options'].get('get_sizes') == 'true'):
+            return False
+        return True
+
+    def copy_response(self, response):
+        """Returns a copy the caller may modify without changing the cache."""
+        copied = collections.OrderedDict()
+        for key,value in response.items():
+            if isinstance(value, list):
+                value = list(value)
+            elif isinstance(value, dict):
+                value = value.copy()
+            copied[key] = value
+        return copied
+
+    def get(self, key):
+        """Returns a copy of the cached response, or None if missing or expired."""
+        with self.lock:
+            entry = self.entries.get(key)
+            if (entry is not None) and (entry[0] <= time.time()):
+                del self.entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return self.copy_response(entry[1])
+
+    def put(self, key, datum, response):
+        """Cache a response and return a copy of it with the parsed type schemas."""
+        tables = set()
+        if 'table_name' in datum:
+            tables.add(datum['table_name'])
+        tables.update(response.get('table_names', []))
+        has_collection = True in response.get('is_collection', [])
+
+        with self.lock:
+            if 'type_schemas' in response:
+                response['type_schema_objects'] = [ schema.parse_cached(type_schema)
+                                                    for type_schema in response['type_schemas'] ]
+            self.entries[key] = [ time.time() + self.ttl, response, tables, has_collection ]
+            return self.copy_response(response)
+
+    def invalidate_tables(self, table_names):
+        """
+        Drop the cached table responses that may mention the tables: their
+        own, those of collections, and those of all tables (table name "").
+        An empty table name drops every table response.
+        """
+        table_names = set(table_names)
+        with self.lock:
+            for key,entry in self.entries.items():
+                if key[0] == '/show/types':
+                    continue
+                if ('' in table_names) or ('' in entry[2]) or entry[3] or (table_names & entry[2]):
+                    del self.entries[key]
+                    self.invalidations += 1
+
+    def invalidate_types(self):
+        """Drop the cached show_types responses."""
+        with self.lock:
+            for key in self.entries.keys():
+                if key[0] == '/show/types':
+                    del self.entries[key]
+                    self.invalidations += 1
+
+    def clear(self):
+        with self.lock:
+            self.invalidations += len(self.entries)
+            self.entries.clear()
+
+    def get_stats(self):
+        """Returns a dict of the cache hit, miss and invalidation counters."""
+        with self.lock:
+            lookups = self.hits + self.misses
+            return { "hits"          : self.hits,
+                     "misses"        : self.misses,
+                     "invalidations" : self.invalidations,
+                     "hit_rate"      : (float(self.hits) / lookups) if lookups else 0.0,
+                     "entries"       : len(self.entries) }
+
+# end class GPUdbMetadataCache
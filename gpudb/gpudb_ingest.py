@@ -0,0 +1,451 @@
+# ---------------------------------------------------------------------------
+# gpudb_ingest.py - Batched and pipelined inserts into one GPUdb table.
+#
+# BulkInserter and InsertPipeline send insert_records through a GPUdb client.
+# ---------------------------------------------------------------------------
+
+import sys
+import threading
+import time
+import Queue
+
+from avro import schema
+
+
+# ---------------------------------------------------------------------------
+# BulkInserter - Batches records of one table into insert_records calls.
+# ---------------------------------------------------------------------------
+
+class BulkInserter:
+    """
+    Buffers records for one table and inserts them with insert_records in
+    batches. Records are encoded as they are added and a batch is flushed
+    once batch_size records or max_bytes of encoded data are buffered, or
+    once the oldest buffered record has waited max_latency seconds. Use
+    close(), or a with statement, to flush the last batch.
+
+    Records can be added while a batch is being inserted. A batch whose
+    insert fails goes back to the front of the buffer, to be sent again by
+    the next flush, and the error is raised; take_records() removes the
+    buffered records instead.
+    """
+
+    def __init__(self, gpudb, table_name, type_schema, batch_size=10000,
+                       max_bytes=None, max_latency=None, options={}):
+        """
+        Parameters:
+            gpudb       : The GPUdb client to insert with.
+            table_name  : Name of the table to insert into.
+            type_schema : The table's type schema, as a string or parsed.
+            batch_size  : Flush when this many records are buffered.
+            max_bytes   : Flush when the encoded records reach this many
+                          bytes, None for no byte limit.
+            max_latency : Flush when the oldest buffered record is this many
+                          seconds old, None to only flush on size. After a
+                          failed flush the timer waits this long again.
+            options     : Options passed on to insert_records.
+        """
+        assert (batch_size > 0), "Expected a positive batch_size, got: '"+str(batch_size)+"'"
+        if gpudb.is_async:
+            raise TypeError("BulkInserter needs a GPUdb client, AsyncGPUdb's insert_records returns a coroutine")
+
+        if isinstance(type_schema, basestring):
+            type_schema = schema.parse_cached(type_schema)
+
+        self.gpudb       = gpudb
+        self.table_name  = table_name
+        self.type_schema = type_schema
+        self.batch_size  = batch_size
+        self.max_bytes   = max_bytes
+        self.max_latency = max_latency
+        self.options     = options
+
+        self.lock = threading.RLock() # Guards the buffer, not held while inserting
+        self.flush_lock = threading.Lock() # One batch is inserted at a time, in order
+        self.wakeup = threading.Condition(self.lock)
+        self.records = []     # Encoded records of the next batch
+        self.num_bytes = 0    # Encoded size of the next batch
+        self.oldest = None    # Time the first record of the batch was added
+        self.error = None     # exc_info of a failed flush by the timer thread
+        self.closed = False
+
+        self.count_inserted = 0
+        self.count_updated  = 0
+        self.num_flushes    = 0
+
+        self.timer = None
+        if max_latency is not None:
+            self.timer = threading.Thread(target=self.flush_on_latency, name="BulkInserter")
+            self.timer.daemon = True
+            self.timer.start()
+    # end __init__
+
+    def check_error(self):
+        """Re-raise an error from a flush made by the latency timer thread."""
+        if self.error is not None:
+            exc_info, self.error = self.error, None
+            raise exc_info[0], exc_info[1], exc_info[2]
+
+    def add(self, record):
+        """Add one record, a dict matching the type schema."""
+        with self.lock:
+            full = self.add_locked(record)
+        if full:
+            self.flush_batch()
+
+    def add_many(self, records):
+        """Add an iterable of records, flushing whenever a threshold is hit."""
+        records = iter(records)
+        while True:
+            full = False
+            with self.lock:
+                for record in records:
+                    if self.add_locked(record):
+                        full = True
+                        break
+            if not full:
+                return
+            self.flush_batch()
+
+    def add_locked(self, record):
+        """Buffer one record, returns True if the batch should be flushed."""
+        assert not self.closed, "BulkInserter for '%s' is closed" % self.table_name
+        self.check_error()
+
+        encoded = self.gpudb.write_datum(self.type_schema, record)
+        self.records.append(encoded)
+        self.num_bytes += len(encoded)
+
+        if self.oldest is None:
+            self.oldest = time.time()
+            self.wakeup.notify()
+
+        return (len(self.records) >= self.batch_size) or \
+               ((self.max_bytes is not None) and (self.num_bytes >= self.max_bytes))
+
+    def flush(self):
+        """
+        Insert the buffered records now. Returns the insert_records response,
+        or None if nothing was buffered.
+        """
+        with self.lock:
+            self.check_error()
+        return self.flush_batch()
+
+    def flush_batch(self):
+        """
+        Insert the buffered records as one batch without holding the buffer
+        lock. If the insert fails the records go back to the front of the
+        buffer and the error is raised.
+        """
+        with self.flush_lock:
+            with self.lock:
+                if len(self.records) == 0:
+                    return None
+                records,num_bytes = self.records,self.num_bytes
+                self.records = []
+                self.num_bytes = 0
+                self.oldest = None
+
+            try:
+                response = self.gpudb.insert_records(self.table_name, records, None, self.options)
+                if response['status_info']['status'] == 'ERROR':
+                    raise ValueError( "insert_records into '%s' failed: %s" %
+                                      (self.table_name, response['status_info']['message']) )
+            except:
+                with self.lock:
+                    self.records = records + self.records
+                    self.num_bytes += num_bytes
+                    self.oldest = time.time() # the timer waits before retrying
+                    self.wakeup.notify()
+                raise
+
+            with self.lock:
+                self.count_inserted += response['count_inserted']
+                self.count_updated  += response['count_updated']
+                self.num_flushes    += 1
+            return response
+
+    def take_records(self):
+        """
+        Remove and return the buffered encoded records, e.g. those of a
+        batch that failed to insert, so that they are not sent.
+        """
+        with self.flush_lock:
+            with self.lock:
+                records = self.records
+                self.records = []
+                self.num_bytes = 0
+                self.oldest = None
+                return records
+
+    def flush_on_latency(self):
+        """Latency timer thread, flushes batches that have waited too long."""
+        while True:
+            with self.lock:
+                while not self.closed:
+                    if self.oldest is None:
+                        self.wakeup.wait()
+                        continue
+
+                    remaining = self.oldest + self.max_latency - time.time()
+                    if remaining <= 0:
+                        break
+                    self.wakeup.wait(remaining)
+
+                if self.closed:
+                    return
+
+            try:
+                self.flush_batch()
+            except Exception:
+                with self.lock:
+                    self.error = sys.exc_info()
+
+    def close(self):
+        """
+        Stop the latency timer thread and flush the remaining records. An
+        error from the timer thread is raised first, leaving the records
+        buffered for flush() or take_records().
+        """
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+            self.wakeup.notify_all()
+
+        if self.timer is not None:
+            self.timer.join()
+
+        with self.lock:
+            self.check_error()
+        self.flush_batch()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            try:
+                self.close()
+            except Exception:
+                pass # keep the original exception
+        return False
+
+# end class BulkInserter
+
+
+# ---------------------------------------------------------------------------
+# InsertPipeline - Sends batches of records from worker threads.
+# ---------------------------------------------------------------------------
+
+class InsertFuture:
+    """
+    The pending insert_records response of one batch submitted to an
+    InsertPipeline.
+    """
+
+    def __init__(self, seq, num_records):
+        self.seq = seq                  # Submission order of the batch
+        self.num_records = num_records  # Number of records in the batch
+        self.event = threading.Event()
+        self.lock = threading.Lock()
+        self.response = None
+        self.exc_info = None
+        self.callbacks = []
+
+    def done(self):
+        """Returns True once the batch has been inserted or has failed."""
+        return self.event.is_set()
+
+    def result(self, timeout=None):
+        """
+        Wait for and return the insert_records response, a dict with the
+        "record_ids", "count_inserted" and "count_updated" of the batch.
+        Raises the insert's error if it failed.
+        """
+        if not self.event.wait(timeout):
+            raise RuntimeError("Timed out waiting for batch %d" % self.seq)
+        if self.exc_info is not None:
+            raise self.exc_info[0], self.exc_info[1], self.exc_info[2]
+        return self.response
+
+    def exception(self, timeout=None):
+        """Wait for the batch and return its error, or None if it succeeded."""
+        if not self.event.wait(timeout):
+            raise RuntimeError("Timed out waiting for batch %d" % self.seq)
+        if self.exc_info is not None:
+            return self.exc_info[1]
+        return None
+
+    def add_done_callback(self, fn):
+        """Call fn(future) when the batch is done, now if it already is."""
+        with self.lock:
+            if not self.event.is_set():
+                self.callbacks.append(fn)
+                return
+        fn(self)
+
+    def set_result(self, response, exc_info=None):
+        with self.lock:
+            self.response = response
+            self.exc_info = exc_info
+            self.event.set()
+            callbacks, self.callbacks = self.callbacks, []
+        for fn in callbacks:
+            fn(self)
+
+# end class InsertFuture
+
+
+class InsertPipeline:
+    """
+    Inserts batches of records into one table from a number of worker
+    threads using the client's pooled connections. submit() encodes a batch
+    in the calling thread while earlier batches are being sent, and blocks
+    once max_in_flight batches are waiting, so a fast producer cannot queue
+    up unbounded memory. With ordered=True the batch futures complete in
+    submission order, otherwise as soon as each insert returns.
+    """
+
+    def __init__(self, gpudb, table_name, type_schema, workers=4,
+                       max_in_flight=None, ordered=False, options={}):
+        """
+        Parameters:
+            gpudb         : The GPUdb client to insert with.
+            table_name    : Name of the table to insert into.
+            type_schema   : The table's type schema, as a string or parsed.
+            workers       : Number of threads sending insert_records requests.
+            max_in_flight : Maximum number of encoded batches waiting to be
+                            sent, None for 2 * workers.
+            ordered       : Complete the batch futures in submission order.
+            options       : Options passed on to insert_records.
+        """
+        assert (workers > 0), "Expected a positive number of workers, got: '"+str(workers)+"'"
+        if gpudb.is_async:
+            raise TypeError("InsertPipeline needs a GPUdb client, AsyncGPUdb's insert_records returns a coroutine")
+
+        if isinstance(type_schema, basestring):
+            type_schema = schema.parse_cached(type_schema)
+        if max_in_flight is None:
+            max_in_flight = 2 * workers
+
+        self.gpudb       = gpudb
+        self.table_name  = table_name
+        self.type_schema = type_schema
+        self.ordered     = ordered
+        self.options     = options
+
+        self.batches = Queue.Queue(max_in_flight)
+        self.lock = threading.Condition()
+        self.submit_lock = threading.Lock()
+        self.next_seq = 0         # Sequence number of the next batch submitted
+        self.next_done = 0        # Next batch to complete when ordered
+        self.pending = set()      # Futures not yet done
+        self.closed = False
+
+        self.count_inserted = 0
+        self.count_updated  = 0
+        self.num_batches    = 0
+        self.num_errors     = 0
+
+        self.workers = []
+        for i in range(workers):
+            worker = threading.Thread(target=self.send_batches, name="InsertPipeline")
+            worker.daemon = True
+            worker.start()
+            self.workers.append(worker)
+    # end __init__
+
+    def submit(self, records):
+        """
+        Encode a batch of records, dicts matching the type schema, and queue
+        it for insertion. Returns an InsertFuture for the batch's response.
+        """
+        encoded = [ self.gpudb.write_datum(self.type_schema, record) for record in records ]
+
+        # Queue batches in sequence order so ordered completion can't stall
+        with self.submit_lock:
+            with self.lock:
+                assert not self.closed, "InsertPipeline for '%s' is closed" % self.table_name
+                future = InsertFuture(self.next_seq, len(encoded))
+                self.next_seq += 1
+                self.pending.add(future)
+            self.batches.put((future, encoded))
+        return future
+
+    def send_batches(self):
+        """Worker thread, inserts queued batches until it gets a None."""
+        while True:
+            item = self.batches.get()
+            if item is None:
+                return
+
+            future,encoded = item
+            try:
+                response = self.gpudb.insert_records(self.table_name, encoded, None, self.options)
+                if response['status_info']['status'] == 'ERROR':
+                    raise ValueError( "insert_records into '%s' failed: %s" %
+                                      (self.table_name, response['status_info']['message']) )
+                self.complete(future, response, None)
+            except:
+                self.complete(future, None, sys.exc_info())
+
+    def complete(self, future, response, exc_info):
+        with self.lock:
+            if self.ordered:
+                while self.next_done != future.seq:
+                    self.lock.wait()
+            self.next_done = max(self.next_done, future.seq + 1)
+
+            if exc_info is None:
+                self.count_inserted += response['count_inserted']
+                self.count_updated  += response['count_updated']
+            else:
+                self.num_errors += 1
+            self.num_batches += 1
+
+            future.set_result(response, exc_info)
+            self.pending.discard(future)
+            self.lock.notify_all()
+
+    def wait(self, timeout=None):
+        """
+        Wait until every batch submitted so far is done. Returns True, or
+        False if the timeout expired first.
+        """
+        end_time = None if timeout is None else time.time() + timeout
+        with self.lock:
+            while len(self.pending) > 0:
+                if end_time is None:
+                    self.lock.wait()
+                else:
+                    remaining = end_time - time.time()
+                    if remaining <= 0:
+                        return False
+                    self.lock.wait(remaining)
+        return True
+
+    def close(self):
+        """Wait for the submitted batches and stop the worker threads."""
+        with self.submit_lock:
+            with self.lock:
+                if self.closed:
+                    return
+                self.closed = True
+
+        for worker in self.workers:
+            self.batches.put(None)
+        for worker in self.workers:
+            worker.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+# end class InsertPipeline
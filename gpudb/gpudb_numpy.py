@@ -0,0 +1,389 @@
+# ---------------------------------------------------------------------------
+# gpudb_numpy.py - Columnar decoding of GPUdb responses into NumPy arrays.
+#
+# Requires numpy; GPUdb.parse_dynamic_response(as_numpy=True) uses it.
+# ---------------------------------------------------------------------------
+
+import sys
+import numpy
+import numpy.ma.mrecords
+
+from avro import io
+
+if sys.version_info >= (2, 7):
+    import collections
+else:
+    import ordereddict as collections # a separate package
+
+
+# Array item types decoded straight from the buffer, as (dtype, item size)
+FIXED_WIDTH_ITEMS = { "double"  : (numpy.dtype("<f8"), 8),
+                      "float"   : (numpy.dtype("<f4"), 4),
+                      "boolean" : (numpy.dtype(numpy.bool_), 1) }
+
+# Array item types encoded as zigzag varints, with their result dtype
+VARINT_ITEMS = { "long" : numpy.dtype(numpy.int64),
+                 "int"  : numpy.dtype(numpy.int32) }
+
+# Field types write_columns() encodes
+COLUMN_TYPES = frozenset(FIXED_WIDTH_ITEMS.keys() + VARINT_ITEMS.keys() + ["string", "bytes", "null"])
+
+# dtype kinds accepted for numeric fields, and the range of integer ones
+COLUMN_KINDS = { "double" : "biuf", "float" : "biuf", "boolean" : "b",
+                 "int" : "biu", "long" : "biu" }
+INTEGER_RANGES = { "int"  : (io.INT_MIN_VALUE, io.INT_MAX_VALUE),
+                   "long" : (io.LONG_MIN_VALUE, io.LONG_MAX_VALUE) }
+
+UINT64_0 = numpy.uint64(0)
+UINT64_1 = numpy.uint64(1)
+UINT64_7F = numpy.uint64(0x7F)
+
+
+def read_fixed_width_items(decoder, count, dtype, size):
+    """Read count little-endian fixed width items in place."""
+    pos = decoder.tell()
+    items = numpy.frombuffer(decoder.buffer, dtype, count, pos)
+    decoder.seek(pos + count * size)
+    return items
+
+
+def read_varint_items(decoder, count, dtype):
+    """
+    Read count zigzag varints at once: the bytes below 0x80 end each
+    varint, the 7-bit groups are shifted into place and OR-ed together per
+    varint with bitwise_or.reduceat, then the zigzag encoding is undone.
+    """
+    pos = decoder.tell()
+    buf = decoder.buffer
+    window = numpy.frombuffer(buf, numpy.uint8, min(len(buf) - pos, 10 * count), pos)
+
+    ends = numpy.flatnonzero(window < 0x80)[:count]
+    if len(ends) < count:
+        raise EOFError("Truncated array of varints")
+    num_bytes = int(ends[-1]) + 1
+    window = window[:num_bytes]
+
+    starts = numpy.empty(count, numpy.intp)
+    starts[0] = 0
+    starts[1:] = ends[:-1] + 1
+
+    # Position of each byte within its varint, times 7 bits
+    shifts = numpy.arange(num_bytes, dtype=numpy.uint64)
+    shifts -= numpy.repeat(starts, ends - starts + 1).astype(numpy.uint64)
+    shifts *= numpy.uint64(7)
+
+    groups = (window.astype(numpy.uint64) & UINT64_7F) << shifts
+    values = numpy.bitwise_or.reduceat(groups, starts)
+    values = (values >> UINT64_1) ^ (UINT64_0 - (values & UINT64_1))
+
+    decoder.seek(pos + num_bytes)
+    return values.view(numpy.int64).astype(dtype, copy=False)
+
+
+def read_string_items(decoder, count, string_dtype):
+    """Read count length prefixed strings; the lengths force a loop."""
+    items = [ decoder.read_utf8() for i in xrange(count) ]
+    if string_dtype is object:
+        array = numpy.empty(count, dtype=object)
+        array[:] = items
+        return array
+    return numpy.array(items, dtype=string_dtype)
+
+
+def read_bytes_items(decoder, count, string_dtype):
+    items = [ decoder.read_bytes() for i in xrange(count) ]
+    if string_dtype is object:
+        array = numpy.empty(count, dtype=object)
+        array[:] = items
+        return array
+    return numpy.array(items, dtype="S")
+
+
+def nullable_item_type(items_schema):
+    """
+    Returns the primitive type of a union of it and null, e.g. "double" for
+    ["double", "null"], or None if the schema is not such a union.
+    """
+    if items_schema.type != "union":
+        return None
+    types = [ branch.type for branch in items_schema.schemas ]
+    if (len(types) != 2) or ("null" not in types):
+        return None
+    types.remove("null")
+    if (types[0] not in FIXED_WIDTH_ITEMS) and (types[0] not in VARINT_ITEMS) and \
+       (types[0] not in ("string", "bytes")):
+        return None
+    return types[0]
+
+
+def read_nullable_array(decoder, items_schema, item_type, string_dtype):
+    """
+    Read an Avro array of a nullable primitive into a 1-d NumPy masked array
+    whose nulls are masked. The union branch of each item is read one at a
+    time, so this is no faster than the compiled reader.
+    """
+    read = io.compile_reader(items_schema)
+    values = []
+    while True:
+        count = decoder.read_long()
+        if count == 0:
+            break
+        if count < 0:
+            count = -count
+            decoder.skip_long()
+        values.extend([ read(decoder) for i in xrange(count) ])
+
+    mask = numpy.array([ value is None for value in values ], dtype=numpy.bool_)
+    if item_type in FIXED_WIDTH_ITEMS:
+        dtype,fill = FIXED_WIDTH_ITEMS[item_type][0],0
+    elif item_type in VARINT_ITEMS:
+        dtype,fill = VARINT_ITEMS[item_type],0
+    elif string_dtype is object:
+        dtype,fill = object,None
+    else:
+        dtype,fill = (string_dtype if item_type == "string" else "S"),""
+
+    if dtype is object:
+        data = numpy.empty(len(values), dtype=object)
+        data[:] = values
+    else:
+        data = numpy.array([ fill if value is None else value for value in values ], dtype=dtype)
+    return numpy.ma.masked_array(data, mask=mask)
+
+
+def read_array(decoder, items_schema, string_dtype=object):
+    """
+    Read an Avro array of primitive items into a 1-d NumPy array, block by
+    block. Items of a union of a primitive and null, e.g. ["double", "null"],
+    are read into a NumPy masked array with the nulls masked. Returns None,
+    reading nothing, if the items are of any other type.
+
+    Parameters:
+        decoder      : An avro.io.BinaryBufferDecoder positioned at the array.
+        items_schema : The parsed schema of the array items.
+        string_dtype : dtype of string columns, object for an array of
+                       unicode objects or e.g. "U" for fixed width.
+    """
+    item_type = items_schema.type
+
+    if item_type in FIXED_WIDTH_ITEMS:
+        dtype,size = FIXED_WIDTH_ITEMS[item_type]
+        read_items = lambda count: read_fixed_width_items(decoder, count, dtype, size)
+    elif item_type in VARINT_ITEMS:
+        dtype = VARINT_ITEMS[item_type]
+        read_items = lambda count: read_varint_items(decoder, count, dtype)
+    elif item_type == "string":
+        dtype = string_dtype
+        read_items = lambda count: read_string_items(decoder, count, string_dtype)
+    elif item_type == "bytes":
+        dtype = string_dtype if string_dtype is object else "S"
+        read_items = lambda count: read_bytes_items(decoder, count, string_dtype)
+    elif nullable_item_type(items_schema) is not None:
+        return read_nullable_array(decoder, items_schema, nullable_item_type(items_schema),
+                                   string_dtype)
+    else:
+        return None
+
+    blocks = []
+    while True:
+        count = decoder.read_long()
+        if count == 0:
+            break
+        if count < 0: # the block's size in bytes follows a negative count
+            count = -count
+            decoder.skip_long()
+        blocks.append(read_items(count))
+
+    if len(blocks) == 0:
+        return numpy.zeros(0, dtype=dtype)
+    if (len(blocks) == 1) and (item_type in ("string", "bytes")):
+        return blocks[0]
+    return numpy.concatenate(blocks) # copies, so frombuffer views are released
+
+
+def read_columns(SCHEMA, encoded_datum, string_dtype=object):
+    """
+    Decode a binary encoded record whose array fields hold columns, such as
+    a dynamic schema response, into an OrderedDict of field values where
+    arrays of primitives are NumPy arrays, and arrays of nullable primitives
+    are NumPy masked arrays. Other fields are decoded with the compiled avro
+    reader as usual.
+
+    Parameters:
+        SCHEMA        : The parsed record schema.
+        encoded_datum : The binary encoded record.
+        string_dtype  : dtype of string columns, object for an array of
+                        unicode objects or e.g. "U" for fixed width.
+    """
+    decoder = io.BinaryBufferDecoder(encoded_datum)
+    columns = collections.OrderedDict()
+
+    for field in SCHEMA.fields:
+        value = None
+        if field.type.type == "array":
+            value = read_array(decoder, field.type.items, string_dtype)
+        if value is None:
+            value = io.compile_reader(field.type)(decoder)
+        columns[field.name] = value
+
+    return columns
+
+
+def to_structured_array(columns):
+    """
+    Combine an OrderedDict of equal length 1-d columns into a NumPy
+    structured array with one field per column, or a masked record array
+    if any column is a masked array, keeping its nulls masked.
+    """
+    names = [ str(name) for name in columns ]
+    if any([ isinstance(column, numpy.ma.MaskedArray) for column in columns.values() ]):
+        return numpy.ma.mrecords.fromarrays(columns.values(), names=names)
+    return numpy.rec.fromarrays(columns.values(), names=names)
+
+
+def encode_varints(values):
+    """
+    Zigzag varint encode an array of integers at once. Returns the encoded
+    bytes as a str and the list of n+1 offsets where each value starts.
+    """
+    values = numpy.asarray(values, dtype=numpy.int64)
+    zigzag = ((values << 1) ^ (values >> 63)).view(numpy.uint64)
+
+    # Number of 7-bit groups of each value, at least one
+    num_bytes = numpy.ones(len(values), dtype=numpy.intp)
+    remaining = zigzag >> numpy.uint64(7)
+    while remaining.any():
+        num_bytes += (remaining != 0)
+        remaining >>= numpy.uint64(7)
+
+    offsets = numpy.zeros(len(values) + 1, dtype=numpy.intp)
+    numpy.cumsum(num_bytes, out=offsets[1:])
+
+    encoded = numpy.empty(offsets[-1], dtype=numpy.uint8)
+    for group in range(int(num_bytes.max()) if len(values) > 0 else 0):
+        has_group = num_bytes > group
+        byte = (zigzag[has_group] >> numpy.uint64(7 * group)) & UINT64_7F
+        more = (num_bytes[has_group] > group + 1).astype(numpy.uint64) << numpy.uint64(7)
+        encoded[offsets[:-1][has_group] + group] = byte | more
+
+    return encoded.tostring(),offsets.tolist()
+
+
+def encode_length_prefixed(items):
+    """Returns each str or unicode item encoded as Avro bytes or string."""
+    items = [ item.encode("utf-8") if isinstance(item, unicode) else item for item in items ]
+    lengths = [ len(item) for item in items ]
+
+    if (len(lengths) == 0) or (max(lengths) <= io.VARINT_TABLE_MAX):
+        table = io.VARINT_TABLE
+        lo = io.VARINT_TABLE_MIN
+        return [ table[length - lo] + item for length,item in zip(lengths, items) ]
+
+    encoded,offsets = encode_varints(lengths)
+    return [ encoded[offsets[i]:offsets[i + 1]] + item for i,item in enumerate(items) ]
+
+
+def can_write_columns(SCHEMA):
+    """Returns True if every field of the record schema is of a type write_columns() encodes."""
+    return all([ field.type.type in COLUMN_TYPES for field in SCHEMA.fields ])
+
+
+def check_column(field, column):
+    """
+    Raise an AvroTypeException for a column with values that do not fit the
+    field, the column-at-a-time counterpart of io.validate(): the dtype of
+    a numeric column is checked, and the range of an integer one, rather
+    than each value; string, bytes and null columns are checked per value.
+    """
+    field_type = field.type.type
+
+    if field_type in ("string", "bytes", "null"):
+        for value in column:
+            if not io.validate(field.type, value):
+                raise io.AvroTypeException(field.type, value)
+        return
+
+    values = numpy.asarray(column)
+    if values.dtype.kind not in COLUMN_KINDS[field_type]:
+        for value in values.flat: # find a value to report
+            if not io.validate(field.type, value):
+                raise io.AvroTypeException(field.type, value)
+        raise io.AvroTypeException(field.type, values.dtype)
+
+    if (field_type in INTEGER_RANGES) and (values.size > 0):
+        lo,hi = INTEGER_RANGES[field_type]
+        for value in (values.min(), values.max()):
+            if not (lo <= int(value) <= hi):
+                raise io.AvroTypeException(field.type, value)
+
+
+def write_columns(SCHEMA, columns, validate=False):
+    """
+    Encode records given as columns into a list of per-record Avro binary
+    encodings, as insert_records takes them. Runs of consecutive double,
+    float and boolean fields are packed for all the records at once with a
+    NumPy structured array, and int and long fields are varint encoded
+    vectorized, leaving the string length prefixes as the per-record work.
+
+    Parameters:
+        SCHEMA  : The parsed record schema, with only primitive fields
+                  (see can_write_columns()).
+        columns : Dict of field name to column, a NumPy array or any
+                  sequence or buffer of numbers for numeric fields, and a
+                  sequence of str or unicode for string and bytes fields.
+                  All columns have the same length, else ValueError is
+                  raised.
+        validate : If True, check each column with check_column() first.
+                  Otherwise values are cast to the field's type unchecked,
+                  e.g. an out of range int wraps around.
+    """
+    fields = SCHEMA.fields
+
+    if validate:
+        for field in fields:
+            if field.type.type in COLUMN_TYPES:
+                check_column(field, columns[field.name])
+
+    num_records = len(columns[fields[0].name]) if fields else 0
+    for field in fields:
+        column = columns[field.name]
+        if len(column) != num_records:
+            raise ValueError("write_columns(): expected column '%s' to hold %d values, got %d" % (field.name, num_records, len(column)))
+    parts = [] # per field (or run of fields), the list of per-record strs
+
+    i = 0
+    while i < len(fields):
+        field = fields[i]
+        field_type = field.type.type
+        column = columns[field.name]
+
+        if field_type in FIXED_WIDTH_ITEMS:
+            run = []
+            while (i < len(fields)) and (fields[i].type.type in FIXED_WIDTH_ITEMS):
+                run.append(fields[i])
+                i += 1
+
+            packed = numpy.empty(num_records, dtype=[ (str(f.name), FIXED_WIDTH_ITEMS[f.type.type][0]) for f in run ])
+            for f in run:
+                packed[str(f.name)] = numpy.asarray(columns[f.name])
+            rows = packed.tostring()
+            size = packed.dtype.itemsize
+            parts.append([ rows[start:start + size] for start in xrange(0, num_records * size, size) ])
+            continue
+
+        if field_type in VARINT_ITEMS:
+            encoded,offsets = encode_varints(column)
+            parts.append([ encoded[offsets[j]:offsets[j + 1]] for j in xrange(num_records) ])
+        elif field_type in ("string", "bytes"):
+            parts.append(encode_length_prefixed(column))
+        elif field_type == "null":
+            pass
+        else:
+            raise ValueError("write_columns(): field '%s' of type '%s' is not supported" % (field.name, field_type))
+        i += 1
+
+    if len(parts) == 0: # only null fields, which encode to nothing
+        return [ "" ] * num_records
+    if len(parts) == 1:
+        return parts[0]
+    return [ "".join(record) for record in zip(*parts) ]
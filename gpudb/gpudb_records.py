@@ -0,0 +1,65 @@
+# ---------------------------------------------------------------------------
+# gpudb_records.py - Decoding pages of binary encoded records.
+#
+# GPUdb.export_table() runs decode_records_page() in worker processes.
+# ---------------------------------------------------------------------------
+
+import sys
+
+from avro import schema, io
+
+if sys.version_info >= (2, 7):
+    import collections
+else:
+    import ordereddict as collections # a separate package
+
+
+# ---------------------------------------------------------------------------
+# Record page decoding for GPUdb.export_table(), run in worker processes.
+# ---------------------------------------------------------------------------
+
+def select_columns(columns, field_names):
+    """
+    Returns the list of columns in order without repeats, raising a
+    ValueError that names any columns not in field_names.
+    """
+    columns = list(collections.OrderedDict.fromkeys(columns))
+    unknown = [ column for column in columns if column not in field_names ]
+    if len(unknown) > 0:
+        raise ValueError( "Unknown columns: %s; the records have: %s" %
+                          (", ".join(unknown), ", ".join(field_names)) )
+    return columns
+
+
+def decode_records_page(type_schema_str, records_binary, columns=None):
+    """
+    Decode a page of binary encoded records, returning a list of dicts.
+    A module level function so that a multiprocessing.Pool can call it.
+
+    Parameters:
+        type_schema_str : The type_schema returned by get_records.
+        records_binary  : List of the binary encoded records.
+        columns         : Optional list of the fields to decode, in order.
+    """
+    type_schema = schema.parse_cached(type_schema_str)
+    if columns is None:
+        read = io.compile_reader(type_schema)
+    else:
+        read = io.compile_projected_reader(type_schema, select_columns(
+            columns, [ field.name for field in type_schema.fields ]))
+    return [ read(io.BinaryBufferDecoder(record)) for record in records_binary ]
+
+
+class DecodedPage:
+    """Stands in for a multiprocessing AsyncResult when decoding in-process."""
+
+    def __init__(self, records):
+        self.records = records
+
+    def ready(self):
+        return True
+
+    def get(self):
+        return self.records
+
+# end class DecodedPage
@@ -82,8 +82,8 @@ class DataFileWriter(object):
     self._writer = writer
     self._encoder = io.BinaryEncoder(writer)
     self._datum_writer = datum_writer
-    self._buffer_writer = StringIO()
-    self._buffer_encoder = io.BinaryEncoder(self._buffer_writer)
+    self._buffer_encoder = io.BinaryBufferEncoder()
+    self._buffer_writer = self._buffer_encoder
     self._block_count = 0
     self._meta = {}
     self._header_written = False
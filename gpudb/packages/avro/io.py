@@ -36,7 +36,11 @@ uses the following mapping:
   * Schema doubles are implemented as float.
   * Schema booleans are implemented as bool. 
 """
+import keyword
+import operator
+import re
 import struct
+import weakref
 from avro import schema
 import sys
 from binascii import crc32
@@ -78,6 +82,12 @@ STRUCT_LONG = struct_class('!Q')    # big-endian unsigned long long
 STRUCT_FLOAT = struct_class('!f')   # big-endian float
 STRUCT_DOUBLE = struct_class('!d')  # big-endian double
 STRUCT_CRC32 = struct_class('>I')   # big-endian unsigned int
+STRUCT_LE_FLOAT = struct_class('<f')   # little-endian float, as written
+STRUCT_LE_DOUBLE = struct_class('<d')  # little-endian double, as written
+
+# Errors raised while encoding a datum that does not match its schema,
+# e.g. struct.pack() of a str or .encode() of an int.
+ENCODING_ERRORS = (AttributeError, TypeError, ValueError, struct.error)
 
 #
 # Exceptions
@@ -224,6 +234,20 @@ class BinaryDecoder(object):
       ((ord(self.read(1)) & 0xffL) << 56))
     return STRUCT_DOUBLE.unpack(STRUCT_LONG.pack(bits))[0]
 
+  def read_float_block(self, n):
+    """
+    Read n consecutive floats, e.g. one block of an array of floats,
+    returned as a tuple.
+    """
+    return struct.unpack('<%df' % n, self.read(4 * n))
+
+  def read_double_block(self, n):
+    """
+    Read n consecutive doubles, e.g. one block of an array of doubles,
+    returned as a tuple.
+    """
+    return struct.unpack('<%dd' % n, self.read(8 * n))
+
   def read_bytes(self):
     """
     Bytes are encoded as a long followed by that many bytes of data. 
@@ -271,6 +295,138 @@ class BinaryDecoder(object):
   def skip(self, n):
     self.reader.seek(self.reader.tell() + n)
 
+class BinaryBufferDecoder(BinaryDecoder):
+  """
+  Read leaf values from an in-memory str (or buffer) through an offset
+  cursor. Fixed-width values are decoded in place with struct.unpack_from
+  rather than assembled from one-byte reads, and whole blocks of floats or
+  doubles are decoded with a single call. Reading past the end of the
+  buffer raises EOFError.
+  """
+  def __init__(self, buffer, offset=0):
+    """
+    buffer is a str or buffer holding the encoded data, offset is where
+    decoding starts.
+    """
+    self._buffer = buffer
+    self._pos = offset
+
+  # read-only properties; the decoder is its own file-like reader
+  buffer = property(lambda self: self._buffer)
+  reader = property(lambda self: self)
+
+  def tell(self):
+    return self._pos
+
+  def seek(self, offset, whence=0):
+    if whence == 1:
+      offset += self._pos
+    elif whence == 2:
+      offset += len(self._buffer)
+    self._pos = offset
+
+  def read(self, n):
+    """
+    Read n bytes.
+    """
+    pos = self._pos
+    end = pos + n
+    if end > len(self._buffer):
+      raise EOFError('Read of %d bytes at %d past the end of the buffer' % (n, pos))
+    self._pos = end
+    return self._buffer[pos:end]
+
+  def read_boolean(self):
+    pos = self._pos
+    try:
+      b = self._buffer[pos]
+    except IndexError:
+      raise EOFError('Read of a boolean at %d past the end of the buffer' % pos)
+    self._pos = pos + 1
+    return ord(b) == 1
+
+  def read_long(self):
+    buf = self._buffer
+    pos = self._pos
+    try:
+      b = ord(buf[pos])
+      pos += 1
+      n = b & 0x7F
+      shift = 7
+      while (b & 0x80) != 0:
+        b = ord(buf[pos])
+        pos += 1
+        n |= (b & 0x7F) << shift
+        shift += 7
+    except IndexError:
+      raise EOFError('Read of a long at %d past the end of the buffer' % self._pos)
+    self._pos = pos
+    return (n >> 1) ^ -(n & 1)
+
+  def read_float(self):
+    pos = self._pos
+    try:
+      value = STRUCT_LE_FLOAT.unpack_from(self._buffer, pos)[0]
+    except struct.error:
+      raise EOFError('Read of a float at %d past the end of the buffer' % pos)
+    self._pos = pos + 4
+    return value
+
+  def read_double(self):
+    pos = self._pos
+    try:
+      value = STRUCT_LE_DOUBLE.unpack_from(self._buffer, pos)[0]
+    except struct.error:
+      raise EOFError('Read of a double at %d past the end of the buffer' % pos)
+    self._pos = pos + 8
+    return value
+
+  def read_float_block(self, n):
+    pos = self._pos
+    try:
+      values = struct.unpack_from('<%df' % n, self._buffer, pos)
+    except struct.error:
+      raise EOFError('Read of %d floats at %d past the end of the buffer' % (n, pos))
+    self._pos = pos + 4 * n
+    return values
+
+  def read_double_block(self, n):
+    pos = self._pos
+    try:
+      values = struct.unpack_from('<%dd' % n, self._buffer, pos)
+    except struct.error:
+      raise EOFError('Read of %d doubles at %d past the end of the buffer' % (n, pos))
+    self._pos = pos + 8 * n
+    return values
+
+  def read_bytes(self):
+    n = self.read_long()
+    pos = self._pos
+    end = pos + n
+    if end > len(self._buffer):
+      raise EOFError('Read of %d bytes at %d past the end of the buffer' % (n, pos))
+    self._pos = end
+    return self._buffer[pos:end]
+
+  def skip_long(self):
+    buf = self._buffer
+    pos = self._pos
+    try:
+      while (ord(buf[pos]) & 0x80) != 0:
+        pos += 1
+    except IndexError:
+      raise EOFError('Skip of a long at %d past the end of the buffer' % self._pos)
+    self._pos = pos + 1
+
+  def skip_bytes(self):
+    n = self.read_long()
+    self._pos += n
+
+  skip_utf8 = skip_bytes
+
+  def skip(self, n):
+    self._pos += n
+
 class BinaryEncoder(object):
   """Write leaf values."""
   def __init__(self, writer):
@@ -367,6 +523,94 @@ class BinaryEncoder(object):
     """
     self.write(STRUCT_CRC32.pack(crc32(bytes) & 0xffffffff));
 
+def _encode_long(datum):
+  """Returns the zig-zag varint encoding of an int or long as a str."""
+  datum = (datum << 1) ^ (datum >> 63)
+  encoded = []
+  while (datum & ~0x7F) != 0:
+    encoded.append(chr((datum & 0x7f) | 0x80))
+    datum >>= 7
+  encoded.append(chr(datum))
+  return ''.join(encoded)
+
+# Precomputed varint encodings of small longs (e.g. string lengths),
+# indexed by datum - VARINT_TABLE_MIN.
+VARINT_TABLE_MIN = -(1 << 11)
+VARINT_TABLE_MAX = (1 << 11) - 1
+VARINT_TABLE = [_encode_long(datum)
+                for datum in xrange(VARINT_TABLE_MIN, VARINT_TABLE_MAX + 1)]
+
+class BinaryBufferEncoder(BinaryEncoder):
+  """
+  Write leaf values into a growable bytearray. Floats and doubles are
+  packed in place with struct.pack_into and small longs come from a
+  precomputed varint table, so no per-byte write or chr() call is made.
+
+  The encoder is its own file-like writer (write, tell, truncate and
+  getvalue), so it can stand in for a BinaryEncoder over a StringIO.
+  """
+  def __init__(self, initial_size=1024):
+    self._buffer = bytearray(initial_size)
+    self._pos = 0
+
+  # read-only properties
+  buffer = property(lambda self: self._buffer)
+  writer = property(lambda self: self)
+
+  def _reserve(self, n):
+    """Make room for n more bytes, returns the offset to write them at."""
+    pos = self._pos
+    end = pos + n
+    size = len(self._buffer)
+    if end > size:
+      self._buffer.extend(bytearray(max(end, 2 * size) - size))
+    self._pos = end
+    return pos
+
+  def write(self, datum):
+    """Write an abritrary datum."""
+    pos = self._reserve(len(datum))
+    self._buffer[pos:self._pos] = datum
+
+  def write_boolean(self, datum):
+    if datum:
+      self.write('\x01')
+    else:
+      self.write('\x00')
+
+  def write_long(self, datum):
+    if VARINT_TABLE_MIN <= datum <= VARINT_TABLE_MAX:
+      self.write(VARINT_TABLE[datum - VARINT_TABLE_MIN])
+    else:
+      self.write(_encode_long(datum))
+
+  def write_int(self, datum):
+    self.write_long(datum)
+
+  def write_float(self, datum):
+    STRUCT_LE_FLOAT.pack_into(self._buffer, self._reserve(4), datum)
+
+  def write_double(self, datum):
+    STRUCT_LE_DOUBLE.pack_into(self._buffer, self._reserve(8), datum)
+
+  def write_bytes(self, datum):
+    self.write_long(len(datum))
+    self.write(datum)
+
+  def tell(self):
+    return self._pos
+
+  def truncate(self, size=0):
+    """Discard everything written after size bytes, keeping the storage."""
+    self._pos = min(size, self._pos)
+
+  def flush(self):
+    pass
+
+  def getvalue(self):
+    """Returns the bytes written so far as a str."""
+    return str(buffer(self._buffer, 0, self._pos))
+
 #
 # DatumReader/Writer
 #
@@ -425,14 +669,16 @@ class DatumReader(object):
       return True
     return False
 
-  def __init__(self, writers_schema=None, readers_schema=None):
+  def __init__(self, writers_schema=None, readers_schema=None, slots=False):
     """
     As defined in the Avro specification, we call the schema encoded
     in the data the "writer's schema", and the schema expected by the
-    reader the "reader's schema".
+    reader the "reader's schema". With slots=True records are read into
+    instances of the reader's record_class() rather than OrderedDicts.
     """
     self._writers_schema = writers_schema
     self._readers_schema = readers_schema 
+    self._slots = slots
 
   # read/write properties
   def set_writers_schema(self, writers_schema):
@@ -443,6 +689,9 @@ class DatumReader(object):
     self._readers_schema = readers_schema
   readers_schema = property(lambda self: self._readers_schema,
                             set_readers_schema)
+  def set_slots(self, slots):
+    self._slots = slots
+  slots = property(lambda self: self._slots, set_slots)
   
   def read(self, decoder):
     if self.readers_schema is None:
@@ -686,32 +935,71 @@ class DatumReader(object):
        writer's schema does not have a field with the same name, then the
        field's value is unset.
     """
-    # schema resolution
-    readers_fields_dict = readers_schema.fields_dict
-    #read_record = {}
-    read_record = collections.OrderedDict()
-    for field in writers_schema.fields:
-      readers_field = readers_fields_dict.get(field.name)
-      if readers_field is not None:
-        field_val = self.read_data(field.type, readers_field.type, decoder)
-        read_record[field.name] = field_val
+    # schema resolution, worked out once per (writer, reader) pair
+    fields, defaults = self._record_plan(writers_schema, readers_schema)
+
+    cls = self._slots and record_class(readers_schema)
+    if cls:
+      read_record = cls()
+    else:
+      read_record = collections.OrderedDict()
+    for field_name, writers_type, readers_type, promote in fields:
+      if field_name is None:
+        self.skip_data(writers_type, decoder)
+      elif promote is None:
+        read_record[field_name] = self.read_data(writers_type, readers_type,
+                                                 decoder)
       else:
-        self.skip_data(field.type, decoder)
+        read_record[field_name] = promote(
+          self.read_data(writers_type, readers_type, decoder))
 
     # fill in default values
-    if len(readers_fields_dict) > len(read_record):
-      writers_fields_dict = writers_schema.fields_dict
-      for field_name, field in readers_fields_dict.items():
-        if not writers_fields_dict.has_key(field_name):
-          if field.has_default:
-            field_val = self._read_default_value(field.type, field.default)
-            read_record[field.name] = field_val
-          else:
-            fail_msg = 'No default value for field %s' % field_name
-            raise SchemaResolutionException(fail_msg, writers_schema,
-                                            readers_schema)
+    for field_name, field_type, default in defaults:
+      read_record[field_name] = self._read_default_value(field_type, default)
     return read_record
 
+  def _record_plan(self, writers_schema, readers_schema):
+    """
+    Return the plan for reading records written with writers_schema as
+    readers_schema: a list of (field name or None to skip, writer's field
+    schema, reader's field schema, promotion function or None) in the
+    writer's field order, and a list of (field name, schema, default) of
+    the reader's fields the writer lacks. Plans are kept on the writer's
+    schema, weakly keyed by the reader's schema so that they go with it.
+    """
+    plans = writers_schema.get_artifact('record_plans',
+                                        lambda s: weakref.WeakKeyDictionary())
+    plan = plans.get(readers_schema)
+    if plan is not None:
+      return plan
+
+    readers_fields_dict = readers_schema.fields_dict
+    fields = []
+    for field in writers_schema.fields:
+      readers_field = readers_fields_dict.get(field.name)
+      if readers_field is None:
+        fields.append((None, field.type, None, None))
+      else:
+        promote = None
+        if (field.type.type in ('int', 'long') and
+            readers_field.type.type in ('float', 'double')):
+          promote = float
+        fields.append((field.name, field.type, readers_field.type, promote))
+
+    writers_fields_dict = writers_schema.fields_dict
+    defaults = []
+    for field in readers_schema.fields:
+      if field.name not in writers_fields_dict:
+        if not field.has_default:
+          fail_msg = 'No default value for field %s' % field.name
+          raise SchemaResolutionException(fail_msg, writers_schema,
+                                          readers_schema)
+        defaults.append((field.name, field.type, field.default))
+
+    plan = (fields, defaults)
+    plans[readers_schema] = plan
+    return plan
+
   def skip_record(self, writers_schema, decoder):
     for field in writers_schema.fields:
       self.skip_data(field.type, decoder)
@@ -760,16 +1048,33 @@ class DatumReader(object):
 
 class DatumWriter(object):
   """DatumWriter for generic python objects."""
-  def __init__(self, writers_schema=None):
+  def __init__(self, writers_schema=None, validate=True):
+    """
+    If validate is False the datum is not checked against the schema before
+    it is written; a mismatch is only detected if encoding it fails, and the
+    encoder may then hold a partially written datum.
+    """
     self._writers_schema = writers_schema
+    self._validate = validate
 
   # read/write properties
   def set_writers_schema(self, writers_schema):
     self._writers_schema = writers_schema
   writers_schema = property(lambda self: self._writers_schema,
                             set_writers_schema)
+  def set_validate(self, validate):
+    self._validate = validate
+  validate = property(lambda self: self._validate, set_validate)
 
   def write(self, datum, encoder):
+    if not self.validate:
+      # let the encoder catch type errors instead of a separate pass
+      try:
+        self.write_data(self.writers_schema, datum, encoder)
+      except ENCODING_ERRORS:
+        raise AvroTypeException(self.writers_schema, datum)
+      return
+
     # validate datum
     if not validate(self.writers_schema, datum):
       raise AvroTypeException(self.writers_schema, datum)
@@ -894,3 +1199,681 @@ class DatumWriter(object):
     """
     for field in writers_schema.fields:
       self.write_data(field.type, datum.get(field.name), encoder)
+
+#
+# Compiled Readers/Writers
+#
+
+# Primitive schemas read and write straight through the decoder and encoder.
+PRIMITIVE_READERS = {
+  'null': operator.methodcaller('read_null'),
+  'boolean': operator.methodcaller('read_boolean'),
+  'string': operator.methodcaller('read_utf8'),
+  'int': operator.methodcaller('read_int'),
+  'long': operator.methodcaller('read_long'),
+  'float': operator.methodcaller('read_float'),
+  'double': operator.methodcaller('read_double'),
+  'bytes': operator.methodcaller('read_bytes'),
+}
+
+PRIMITIVE_WRITERS = {
+  'null': lambda datum, encoder: encoder.write_null(datum),
+  'boolean': lambda datum, encoder: encoder.write_boolean(datum),
+  'string': lambda datum, encoder: encoder.write_utf8(datum),
+  'int': lambda datum, encoder: encoder.write_int(datum),
+  'long': lambda datum, encoder: encoder.write_long(datum),
+  'float': lambda datum, encoder: encoder.write_float(datum),
+  'double': lambda datum, encoder: encoder.write_double(datum),
+  'bytes': lambda datum, encoder: encoder.write_bytes(datum),
+}
+
+PRIMITIVE_SKIPPERS = {
+  'null': operator.methodcaller('skip_null'),
+  'boolean': operator.methodcaller('skip_boolean'),
+  'string': operator.methodcaller('skip_utf8'),
+  'int': operator.methodcaller('skip_int'),
+  'long': operator.methodcaller('skip_long'),
+  'float': operator.methodcaller('skip_float'),
+  'double': operator.methodcaller('skip_double'),
+  'bytes': operator.methodcaller('skip_bytes'),
+}
+
+# encoded size of the types whose values always take the same number of bytes
+FIXED_SIZES = {
+  'null': 0,
+  'boolean': 1,
+  'float': 4,
+  'double': 8,
+}
+
+#
+# Records with __slots__
+#
+
+class Record(object):
+  """
+  Base class of the per-schema record classes made by record_class().
+  Field values are kept in __slots__ rather than a per-record dict and can
+  be read as attributes or, like the OrderedDicts records otherwise decode
+  to, by item access in field order. Records whose field names are not
+  identifiers or clash with the attributes below have no such class and
+  are decoded to OrderedDicts.
+  """
+  __slots__ = ()
+  _fields = ()          # field names in schema order
+  _index = frozenset()  # field names, for membership tests
+  _schema_json = None   # JSON of the record schema, for pickling
+
+  def __init__(self, *values):
+    values = values + (None,) * (len(self._fields) - len(values))
+    for name, value in zip(self._fields, values):
+      setattr(self, name, value)
+
+  def __getitem__(self, key):
+    if key not in self._index:
+      raise KeyError(key)
+    return getattr(self, key)
+
+  def __setitem__(self, key, value):
+    if key not in self._index:
+      raise KeyError(key)
+    setattr(self, key, value)
+
+  def __contains__(self, key):
+    return key in self._index
+
+  def __iter__(self):
+    return iter(self._fields)
+
+  def __len__(self):
+    return len(self._fields)
+
+  def get(self, key, default=None):
+    if key not in self._index:
+      return default
+    return getattr(self, key)
+
+  def keys(self):
+    return list(self._fields)
+
+  def values(self):
+    return [getattr(self, name) for name in self._fields]
+
+  def items(self):
+    return [(name, getattr(self, name)) for name in self._fields]
+
+  iterkeys = __iter__
+
+  def itervalues(self):
+    return iter(self.values())
+
+  def iteritems(self):
+    return iter(self.items())
+
+  # Record.items() rather than self.items(), which a field could hide
+
+  def to_dict(self):
+    return collections.OrderedDict(Record.items(self))
+
+  def __eq__(self, other):
+    if isinstance(other, Record):
+      return Record.items(self) == Record.items(other)
+    if isinstance(other, dict):
+      return dict(Record.items(self)) == other
+    return NotImplemented
+
+  def __ne__(self, other):
+    equal = self.__eq__(other)
+    if equal is NotImplemented:
+      return equal
+    return not equal
+
+  __hash__ = None
+
+  def __repr__(self):
+    return '%s(%s)' % (self.__class__.__name__,
+                       ', '.join(['%s=%r' % item for item in Record.items(self)]))
+
+  def __reduce__(self):
+    # the classes are made at run time, so pickle by schema
+    return (_rebuild_record, (self._schema_json, tuple(Record.values(self))))
+
+def _rebuild_record(schema_json, values):
+  return record_class(schema.parse_cached(schema_json))(*values)
+
+_IDENTIFIER = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
+# names a field cannot take without hiding what Record itself defines
+_RECORD_ATTRIBUTES = frozenset(dir(Record))
+
+def _is_slot_name(name):
+  """
+  Return True if name can be a slot: an ASCII identifier that is not
+  name-mangled (a leading __) and does not clash with a Record attribute.
+  """
+  return (_IDENTIFIER.match(name) is not None and not name.startswith('__')
+          and name not in _RECORD_ATTRIBUTES)
+
+def _make_record_class(record_schema):
+  if not all([_is_slot_name(field.name) for field in record_schema.fields]):
+    return None
+  fields = tuple([str(field.name) for field in record_schema.fields])
+  namespace = {'__slots__': fields,
+               '_fields': fields,
+               '_index': frozenset(fields),
+               '_schema_json': str(record_schema)}
+
+  # a generated __init__ assigns the slots without a loop
+  if all([_IDENTIFIER.match(name) and not keyword.iskeyword(name)
+          and name != 'self' for name in fields]):
+    source = 'def __init__(self, %s):\n' % ', '.join(['%s=None' % name for name in fields])
+    source += ''.join(['  self.%s = %s\n' % (name, name) for name in fields]) or '  pass\n'
+    scope = {}
+    exec source in scope
+    namespace['__init__'] = scope['__init__']
+
+  name = str(getattr(record_schema, 'name', None) or 'Record')
+  if not _IDENTIFIER.match(name):
+    name = 'Record'
+  return type(name, (Record,), namespace)
+
+def record_class(record_schema):
+  """
+  Return the Record subclass with one slot per field of the record schema,
+  made once and kept as the schema's 'record_class' artifact, or None if
+  a field name cannot be a slot (see _is_slot_name()).
+  """
+  return record_schema.get_artifact('record_class', _make_record_class)
+
+def compile_reader(writers_schema, slots=False):
+  """
+  Compile a schema into a function that takes a decoder and returns the
+  next datum, equivalent to DatumReader(writers_schema).read(decoder) but
+  without the per-node type dispatch and schema matching. With slots=True
+  records are decoded into record_class() instances instead of
+  OrderedDicts. The function is built once and kept as one of the schema's
+  'compiled_reader' or 'compiled_slots_reader' artifacts.
+  """
+  key = slots and 'compiled_slots_reader' or 'compiled_reader'
+  reader = writers_schema._artifacts.get(key)
+  if reader is None:
+    reader = writers_schema.get_artifact(key,
+                                         lambda s: _compile_reader(s, {}, slots))
+  return reader
+
+def compile_writer(writers_schema):
+  """
+  Compile a schema into a function taking (datum, encoder), equivalent to
+  DatumWriter(writers_schema).write_data(writers_schema, datum, encoder).
+  The datum is not validated. The function is built once and kept as the
+  schema's 'compiled_writer' artifact.
+  """
+  writer = writers_schema._artifacts.get('compiled_writer')
+  if writer is None:
+    writer = writers_schema.get_artifact('compiled_writer',
+                                         lambda s: _compile_writer(s, {}))
+  return writer
+
+def compile_projected_reader(writers_schema, field_names, slots=False):
+  """
+  Compile a record schema into a reader of just the named fields, like
+  DatumReader(writers_schema, writers_schema.project(field_names)) but with
+  the fields in the order given, any repeats dropped. The other fields are
+  passed over with compiled skippers, consecutive
+  fixed-width ones with a single skip. With slots=True records are decoded
+  into the projected schema's record_class(). The function is built once
+  per list of names and kept as an artifact of the writer's schema.
+  """
+  field_names = tuple(collections.OrderedDict.fromkeys(field_names))
+  key = ('compiled_projected_reader', field_names, slots)
+  reader = writers_schema._artifacts.get(key)
+  if reader is None:
+    reader = writers_schema.get_artifact(key,
+        lambda s: _compile_projected_reader(s, field_names, slots))
+  return reader
+
+def compile_skipper(writers_schema):
+  """
+  Compile a schema into a function that takes a decoder and moves it past
+  the next datum without decoding it, equivalent to
+  DatumReader().skip_data(writers_schema, decoder). The function is built
+  once and kept as the schema's 'compiled_skipper' artifact.
+  """
+  skipper = writers_schema._artifacts.get('compiled_skipper')
+  if skipper is None:
+    skipper = writers_schema.get_artifact('compiled_skipper',
+                                          lambda s: _compile_skipper(s, {}))
+  return skipper
+
+def _compile_reader(writers_schema, compiled, slots=False):
+  schema_type = writers_schema.type
+  if schema_type in PRIMITIVE_READERS:
+    return PRIMITIVE_READERS[schema_type]
+
+  # named records may refer to themselves, so hand out a forwarding reader
+  if id(writers_schema) in compiled:
+    return compiled[id(writers_schema)]
+
+  if schema_type == 'fixed':
+    size = writers_schema.size
+    def read_fixed(decoder):
+      return decoder.read(size)
+    return read_fixed
+  elif schema_type == 'enum':
+    symbols = writers_schema.symbols
+    def read_enum(decoder):
+      index_of_symbol = decoder.read_int()
+      if index_of_symbol >= len(symbols):
+        fail_msg = "Can't access enum index %d for enum with %d symbols"\
+                   % (index_of_symbol, len(symbols))
+        raise SchemaResolutionException(fail_msg, writers_schema,
+                                        writers_schema)
+      return symbols[index_of_symbol]
+    return read_enum
+  elif schema_type == 'array' and writers_schema.items.type in ['float', 'double']:
+    # fixed-width items are decoded a whole block at a time
+    read_block_name = 'read_%s_block' % writers_schema.items.type
+    def read_array(decoder):
+      read_items = []
+      block_count = decoder.read_long()
+      while block_count != 0:
+        if block_count < 0:
+          block_count = -block_count
+          decoder.read_long()
+        read_items.extend(getattr(decoder, read_block_name)(block_count))
+        block_count = decoder.read_long()
+      return read_items
+    return read_array
+  elif schema_type == 'array':
+    read_item = _compile_reader(writers_schema.items, compiled, slots)
+    def read_array(decoder):
+      read_items = []
+      append = read_items.append
+      block_count = decoder.read_long()
+      while block_count != 0:
+        if block_count < 0:
+          block_count = -block_count
+          decoder.read_long()
+        for i in xrange(block_count):
+          append(read_item(decoder))
+        block_count = decoder.read_long()
+      return read_items
+    return read_array
+  elif schema_type == 'map':
+    read_value = _compile_reader(writers_schema.values, compiled, slots)
+    def read_map(decoder):
+      read_items = {}
+      block_count = decoder.read_long()
+      while block_count != 0:
+        if block_count < 0:
+          block_count = -block_count
+          decoder.read_long()
+        for i in xrange(block_count):
+          key = decoder.read_utf8()
+          read_items[key] = read_value(decoder)
+        block_count = decoder.read_long()
+      return read_items
+    return read_map
+  elif schema_type in ['union', 'error_union']:
+    branches = [_compile_reader(s, compiled, slots) for s in writers_schema.schemas]
+    def read_union(decoder):
+      index_of_schema = int(decoder.read_long())
+      if index_of_schema >= len(branches):
+        fail_msg = "Can't access branch index %d for union with %d branches"\
+                   % (index_of_schema, len(branches))
+        raise SchemaResolutionException(fail_msg, writers_schema,
+                                        writers_schema)
+      return branches[index_of_schema](decoder)
+    return read_union
+  elif schema_type in ['record', 'error', 'request']:
+    field_readers = []
+    compiled[id(writers_schema)] = lambda decoder: read_record(decoder)
+    for field in writers_schema.fields:
+      field_readers.append((field.name, _compile_reader(field.type, compiled, slots)))
+    cls = slots and record_class(writers_schema)
+    if cls:
+      read_fields = [read_field for field_name, read_field in field_readers]
+      def read_record(decoder):
+        return cls(*[read_field(decoder) for read_field in read_fields])
+      return read_record
+    OrderedDict = collections.OrderedDict
+    def read_record(decoder):
+      record = OrderedDict()
+      for field_name, read_field in field_readers:
+        record[field_name] = read_field(decoder)
+      return record
+    return read_record
+  else:
+    fail_msg = "Cannot read unknown schema type: %s" % schema_type
+    raise schema.AvroException(fail_msg)
+
+def _compile_writer(writers_schema, compiled):
+  schema_type = writers_schema.type
+  if schema_type in PRIMITIVE_WRITERS:
+    return PRIMITIVE_WRITERS[schema_type]
+
+  if id(writers_schema) in compiled:
+    return compiled[id(writers_schema)]
+
+  if schema_type == 'fixed':
+    def write_fixed(datum, encoder):
+      encoder.write(datum)
+    return write_fixed
+  elif schema_type == 'enum':
+    symbols = writers_schema.symbols
+    def write_enum(datum, encoder):
+      encoder.write_int(symbols.index(datum))
+    return write_enum
+  elif schema_type == 'array':
+    write_item = _compile_writer(writers_schema.items, compiled)
+    def write_array(datum, encoder):
+      if len(datum) > 0:
+        encoder.write_long(len(datum))
+        for item in datum:
+          write_item(item, encoder)
+      encoder.write_long(0)
+    return write_array
+  elif schema_type == 'map':
+    write_value = _compile_writer(writers_schema.values, compiled)
+    def write_map(datum, encoder):
+      if len(datum) > 0:
+        encoder.write_long(len(datum))
+        for key, val in datum.items():
+          encoder.write_utf8(key)
+          write_value(val, encoder)
+      encoder.write_long(0)
+    return write_map
+  elif schema_type in ['union', 'error_union']:
+    candidates = writers_schema.schemas
+    branches = [_compile_writer(s, compiled) for s in candidates]
+    def write_union(datum, encoder):
+      # like DatumWriter.write_union, the last matching branch wins
+      index_of_schema = -1
+      for i, candidate_schema in enumerate(candidates):
+        if validate(candidate_schema, datum):
+          index_of_schema = i
+      if index_of_schema < 0: raise AvroTypeException(writers_schema, datum)
+      encoder.write_long(index_of_schema)
+      branches[index_of_schema](datum, encoder)
+    return write_union
+  elif schema_type in ['record', 'error', 'request']:
+    field_writers = []
+    compiled[id(writers_schema)] = lambda datum, encoder: write_record(datum, encoder)
+    for field in writers_schema.fields:
+      field_writers.append((field.name, _compile_writer(field.type, compiled)))
+    def write_record(datum, encoder):
+      get = datum.get
+      for field_name, write_field in field_writers:
+        write_field(get(field_name), encoder)
+    return write_record
+  else:
+    fail_msg = 'Unknown type: %s' % schema_type
+    raise schema.AvroException(fail_msg)
+
+def _compile_skipper(writers_schema, compiled):
+  schema_type = writers_schema.type
+  if schema_type in PRIMITIVE_SKIPPERS:
+    return PRIMITIVE_SKIPPERS[schema_type]
+
+  if id(writers_schema) in compiled:
+    return compiled[id(writers_schema)]
+
+  if schema_type == 'fixed':
+    size = writers_schema.size
+    def skip_fixed(decoder):
+      decoder.skip(size)
+    return skip_fixed
+  elif schema_type == 'enum':
+    return PRIMITIVE_SKIPPERS['int']
+  elif schema_type in ['array', 'map']:
+    skip_item = _compile_skipper(schema_type == 'array' and writers_schema.items
+                                 or writers_schema.values, compiled)
+    is_map = (schema_type == 'map')
+    def skip_blocks(decoder):
+      block_count = decoder.read_long()
+      while block_count != 0:
+        if block_count < 0:
+          # the block's size in bytes follows a negative count
+          decoder.skip(decoder.read_long())
+        else:
+          for i in xrange(block_count):
+            if is_map:
+              decoder.skip_utf8()
+            skip_item(decoder)
+        block_count = decoder.read_long()
+    return skip_blocks
+  elif schema_type in ['union', 'error_union']:
+    branches = [_compile_skipper(s, compiled) for s in writers_schema.schemas]
+    def skip_union(decoder):
+      index_of_schema = int(decoder.read_long())
+      if index_of_schema >= len(branches):
+        fail_msg = "Can't access branch index %d for union with %d branches"\
+                   % (index_of_schema, len(branches))
+        raise SchemaResolutionException(fail_msg, writers_schema)
+      branches[index_of_schema](decoder)
+    return skip_union
+  elif schema_type in ['record', 'error', 'request']:
+    compiled[id(writers_schema)] = lambda decoder: skip_record(decoder)
+    field_skippers = [_compile_skipper(field.type, compiled)
+                      for field in writers_schema.fields]
+    def skip_record(decoder):
+      for skip_field in field_skippers:
+        skip_field(decoder)
+    return skip_record
+  else:
+    fail_msg = 'Unknown schema type: %s' % schema_type
+    raise schema.AvroException(fail_msg)
+
+def _compile_projected_reader(writers_schema, field_names, slots):
+  readers_schema = writers_schema.project(field_names)
+  positions = dict([(name, i) for i, name in enumerate(field_names)])
+
+  # per writer's field, its position in the result and reader, or None and
+  # a skipper; runs of fixed-width skipped fields become a single skip
+  steps = []
+  skip_size = 0
+  for field in writers_schema.fields:
+    if field.name not in positions and field.type.type in FIXED_SIZES:
+      skip_size += FIXED_SIZES[field.type.type]
+      continue
+    if skip_size:
+      steps.append((None, operator.methodcaller('skip', skip_size)))
+      skip_size = 0
+    if field.name in positions:
+      steps.append((positions[field.name], compile_reader(field.type, slots)))
+    else:
+      steps.append((None, compile_skipper(field.type)))
+  if skip_size:
+    steps.append((None, operator.methodcaller('skip', skip_size)))
+
+  num_fields = len(field_names)
+  def read_values(decoder):
+    values = [None] * num_fields
+    for position, step in steps:
+      if position is None:
+        step(decoder)
+      else:
+        values[position] = step(decoder)
+    return values
+
+  cls = slots and record_class(readers_schema)
+  if cls:
+    def read_record(decoder):
+      return cls(*read_values(decoder))
+    return read_record
+  OrderedDict = collections.OrderedDict
+  names = [field.name for field in readers_schema.fields]
+  def read_record(decoder):
+    return OrderedDict(zip(names, read_values(decoder)))
+  return read_record
+
+#
+# Lazy record views
+#
+
+class _LazyLayout(object):
+  """
+  What LazyRecord needs to know about a record schema: the field names and
+  their positions, a compiled reader and skipper per field, and the offsets
+  of the fields up to the first one of variable size, which are the same
+  in every record.
+  """
+  def __init__(self, record_schema):
+    fields = record_schema.fields
+    self.fields = tuple([field.name for field in fields])
+    self.index = dict([(name, i) for i, name in enumerate(self.fields)])
+    self.readers = [compile_reader(field.type) for field in fields]
+    self.skippers = [compile_skipper(field.type) for field in fields]
+    self.schema_json = str(record_schema)
+
+    static_offsets = [0]
+    for field in fields:
+      if field.type.type == 'fixed':
+        size = field.type.size
+      elif field.type.type in FIXED_SIZES:
+        size = FIXED_SIZES[field.type.type]
+      else:
+        break
+      static_offsets.append(static_offsets[-1] + size)
+    self.static_offsets = tuple(static_offsets)
+
+def lazy_layout(record_schema):
+  """
+  Return the _LazyLayout of a record schema, made once and kept as the
+  schema's 'lazy_layout' artifact.
+  """
+  layout = record_schema._artifacts.get('lazy_layout')
+  if layout is None:
+    layout = record_schema.get_artifact('lazy_layout', _LazyLayout)
+  return layout
+
+class LazyRecord(object):
+  """
+  A read-only view of one binary encoded record that keeps the encoded
+  bytes and decodes a field only when it is accessed. Nothing is decoded up
+  front; reaching a field moves past the fields before it with compiled
+  skippers, which step over strings and bytes by their length prefix
+  without copying them. The field offsets found on the way and the decoded
+  values are kept, so each field is skipped over or decoded at most once.
+
+  Fields can be read by item access in field order, like the OrderedDicts
+  records otherwise decode to, or as attributes. A field named like one of
+  the methods below is only reachable by item access.
+  """
+  __slots__ = ('_layout', '_buffer', '_start', '_offsets', '_values')
+
+  def __init__(self, record_schema, buffer, offset=0):
+    """
+    record_schema is the parsed writer's record schema, buffer the str (or
+    buffer) holding the encoded record, starting at offset. The buffer is
+    referenced, not copied.
+    """
+    self._layout = lazy_layout(record_schema)
+    self._buffer = buffer
+    self._start = offset
+    self._offsets = None  # offsets of the fields found so far
+    self._values = None   # field index to decoded value
+
+  def _offset(self, i):
+    """Offset of field i, or of the record's end for i == len(self)."""
+    offsets = self._offsets
+    if offsets is None:
+      start = self._start
+      offsets = self._offsets = [start + offset
+                                 for offset in self._layout.static_offsets]
+    if len(offsets) <= i:
+      skippers = self._layout.skippers
+      decoder = BinaryBufferDecoder(self._buffer, offsets[-1])
+      while len(offsets) <= i:
+        skippers[len(offsets) - 1](decoder)
+        offsets.append(decoder.tell())
+    return offsets[i]
+
+  def _field_value(self, i):
+    values = self._values
+    if values is None:
+      values = self._values = {}
+    elif i in values:
+      return values[i]
+
+    decoder = BinaryBufferDecoder(self._buffer, self._offset(i))
+    value = values[i] = self._layout.readers[i](decoder)
+    # the end of this field is where the next one starts
+    if len(self._offsets) == i + 1:
+      self._offsets.append(decoder.tell())
+    return value
+
+  def __getitem__(self, key):
+    return self._field_value(self._layout.index[key])
+
+  def __getattr__(self, name):
+    if name in LazyRecord.__slots__:
+      raise AttributeError(name)
+    i = self._layout.index.get(name)
+    if i is None:
+      raise AttributeError(name)
+    return self._field_value(i)
+
+  def __contains__(self, key):
+    return key in self._layout.index
+
+  def __iter__(self):
+    return iter(self._layout.fields)
+
+  def __len__(self):
+    return len(self._layout.fields)
+
+  def get(self, key, default=None):
+    i = self._layout.index.get(key)
+    if i is None:
+      return default
+    return self._field_value(i)
+
+  def keys(self):
+    return list(self._layout.fields)
+
+  def values(self):
+    return [self._field_value(i) for i in xrange(len(self._layout.fields))]
+
+  def items(self):
+    return zip(self._layout.fields, self.values())
+
+  iterkeys = __iter__
+
+  def itervalues(self):
+    return iter(self.values())
+
+  def iteritems(self):
+    return iter(self.items())
+
+  def to_dict(self):
+    return collections.OrderedDict(self.items())
+
+  @property
+  def raw(self):
+    """The encoded bytes of the record."""
+    return self._buffer[self._start:self._offset(len(self._layout.fields))]
+
+  def __eq__(self, other):
+    if isinstance(other, (LazyRecord, Record)):
+      return self.items() == other.items()
+    if isinstance(other, dict):
+      return dict(self.items()) == other
+    return NotImplemented
+
+  def __ne__(self, other):
+    equal = self.__eq__(other)
+    if equal is NotImplemented:
+      return equal
+    return not equal
+
+  __hash__ = None
+
+  def __repr__(self):
+    return 'LazyRecord(%s)' % ', '.join(['%s=%r' % item for item in self.items()])
+
+  def __reduce__(self):
+    return (_rebuild_lazy_record, (self._layout.schema_json, str(self.raw)))
+
+def _rebuild_lazy_record(schema_json, raw):
+  return LazyRecord(schema.parse_cached(schema_json), raw)
@@ -37,6 +37,11 @@ try:
   import json
 except ImportError:
   import simplejson as json
+import threading
+try:
+  from collections import OrderedDict
+except ImportError:
+  from ordereddict import OrderedDict
 
 #
 # Constants
@@ -108,6 +113,18 @@ class SchemaParseException(AvroException):
 # Base Classes
 #
 
+class ImmutableDict(dict):
+  """A dict that raises TypeError on any attempt to modify it."""
+  def _read_only(self, *args, **kwargs):
+    raise TypeError('%s is read-only' % self.__class__.__name__)
+
+  __setitem__ = __delitem__ = _read_only
+  clear = pop = popitem = setdefault = update = _read_only
+
+  def __reduce__(self):
+    # pickle and copy through the constructor rather than item assignment
+    return (self.__class__, (dict(self),))
+
 class Schema(object):
   """Base class for all Schema classes."""
   def __init__(self, type, other_props=None):
@@ -121,6 +138,7 @@ class Schema(object):
 
     # add members
     if not hasattr(self, '_props'): self._props = {}
+    self._artifacts = {}
     self.set_prop('type', type)
     self.type = type
     self._props.update(other_props or {})
@@ -140,6 +158,28 @@ class Schema(object):
   def set_prop(self, key, value):
     self._props[key] = value
 
+  def get_artifact(self, key, build):
+    """
+    Return the value derived from this schema that is stored under key,
+    calling build(self) to make it the first time. Compiled codecs and
+    other per-schema precomputation live here, so a schema shared through
+    parse_cached() is only processed once.
+    """
+    artifacts = self._artifacts
+    if key not in artifacts:
+      artifacts[key] = build(self)
+    return artifacts[key]
+
+  def __getstate__(self):
+    # artifacts may hold compiled closures, which cannot be pickled; they
+    # are rebuilt on first use by the copy
+    state = self.__dict__.copy()
+    state['_artifacts'] = {}
+    return state
+
+  def __setstate__(self, state):
+    self.__dict__.update(state)
+
   def __str__(self):
     return json.dumps(self.to_json())
 
@@ -671,10 +711,34 @@ class RecordSchema(NamedSchema):
 
   @property
   def fields_dict(self):
-    fields_dict = {}
-    for field in self.fields:
-      fields_dict[field.name] = field
-    return fields_dict
+    """Read-only dict of field name to Field, built once per schema."""
+    return self.get_artifact('fields_dict', lambda s: ImmutableDict(
+        [(field.name, field) for field in s.fields]))
+
+  def project(self, field_names):
+    """
+    Return the reader's schema of this record with only the named fields,
+    in the order given with any repeats dropped, for decoding a subset of
+    the fields. It is made once per list of names and kept as an artifact.
+    """
+    field_names = tuple(OrderedDict.fromkeys(field_names))
+    return self.get_artifact(('projection', field_names),
+                             lambda s: s._make_projection(field_names))
+
+  def _make_projection(self, field_names):
+    fields_dict = self.fields_dict
+    unknown = [name for name in field_names if name not in fields_dict]
+    if unknown:
+      fail_msg = 'Fields %s are not in record %s.' % (', '.join(unknown), self.fullname)
+      raise AvroException(fail_msg)
+
+    names = Names()
+    names.names[self.fullname] = self # the fields may refer to the record
+    fields = [fields_dict[name].to_json(names) for name in field_names]
+
+    to_dump = self.props.copy()
+    to_dump['fields'] = fields
+    return make_avsc_object(to_dump, Names())
 
   def to_json(self, names=None):
     if names is None:
@@ -782,3 +846,53 @@ def parse(json_string):
 
   # construct the Avro Schema object
   return make_avsc_object(json_data, names)
+
+class SchemaCache(object):
+  """
+  A bounded, thread-safe LRU cache of parsed schemas keyed by their JSON
+  text. The cached schemas are shared by every caller, so they must not be
+  modified; attach derived values with get_artifact() instead.
+  """
+  def __init__(self, max_size=1024):
+    self.max_size = max_size
+    self._lock = threading.Lock()
+    self._schemas = OrderedDict()
+    self.hits = 0
+    self.misses = 0
+
+  def parse(self, json_string):
+    """Return the cached schema for the JSON text, parsing it on a miss."""
+    with self._lock:
+      schema = self._schemas.pop(json_string, None)
+      if schema is not None:
+        self._schemas[json_string] = schema # most recently used last
+        self.hits += 1
+        return schema
+      self.misses += 1
+
+    schema = parse(json_string)
+
+    with self._lock:
+      # keep the first schema parsed, and its artifacts, on a race
+      schema = self._schemas.setdefault(json_string, schema)
+      while len(self._schemas) > self.max_size:
+        self._schemas.popitem(last=False)
+    return schema
+
+  def clear(self):
+    with self._lock:
+      self._schemas.clear()
+
+  def get_stats(self):
+    with self._lock:
+      return {'hits': self.hits, 'misses': self.misses,
+              'size': len(self._schemas), 'max_size': self.max_size}
+
+SCHEMA_CACHE = SchemaCache()
+
+def parse_cached(json_string):
+  """
+  Like parse(), but returns the schema shared through the process-wide
+  SCHEMA_CACHE when the same JSON text was parsed before.
+  """
+  return SCHEMA_CACHE.parse(json_string)
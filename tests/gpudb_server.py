@@ -0,0 +1,220 @@
+# ---------------------------------------------------------------------------
+# gpudb_server.py - A local stand-in GPUdb server for the client tests.
+#
+# Answers the endpoints the tests set a handler for, over keep-alive
+# HTTP/1.1, from a thread of the test process.
+# ---------------------------------------------------------------------------
+
+import BaseHTTPServer, SocketServer
+import socket
+import threading
+import time
+import zlib
+
+from gpudb.gpudb import GPUdb, collections
+from avro import io
+
+
+# A client only used for its endpoint schemas
+schemas = GPUdb()
+
+
+def encode(SCHEMA, datum):
+    return schemas.write_datum(SCHEMA, datum)
+
+def decode(SCHEMA, encoded_datum):
+    return io.compile_reader(SCHEMA)(io.BinaryBufferDecoder(encoded_datum))
+
+def schema_name(path):
+    """Returns the schema base name of an endpoint path, e.g. "get_records"."""
+    return path[1:].replace('/', '_')
+
+
+def free_port():
+    """Returns a local port nothing listens on, for a head node that is down."""
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def read_body(self):
+        if self.headers.get('Transfer-Encoding') == 'chunked':
+            chunks = []
+            while True:
+                size = int(self.rfile.readline().strip(), 16)
+                if size == 0:
+                    self.rfile.readline()
+                    break
+                chunks.append(self.rfile.read(size))
+                self.rfile.readline()
+            body = "".join(chunks)
+        else:
+            body = self.rfile.read(int(self.headers['Content-Length']))
+
+        encoding = self.headers.get('Content-Encoding')
+        if encoding == 'gzip':
+            body = zlib.decompress(body, 16 + zlib.MAX_WBITS)
+        elif encoding == 'deflate':
+            body = zlib.decompress(body)
+        return body
+
+    def do_POST(self):
+        server = self.server.gpudb_server
+        body = self.read_body()
+        path = self.path[len(server.url_path):]
+        REQ_SCHEMA,RSP_SCHEMA = schemas.get_schemas(schema_name(path))
+        request = decode(REQ_SCHEMA, body)
+
+        with server.lock:
+            server.requests.append((path, dict(self.headers), request, len(body)))
+            delay = server.delay.get(path, 0)
+            drop = path in server.drop
+
+        if delay:
+            time.sleep(delay)
+        if drop: # close the connection without a reply
+            self.close_connection = 1
+            return
+
+        handler = server.handlers[path]
+        try:
+            data = encode(RSP_SCHEMA, handler(request))
+            response = { 'status': 'OK', 'message': '', 'data_type': schema_name(path) + '_response',
+                         'data': data, 'data_str': '' }
+        except Exception, e:
+            response = { 'status': 'ERROR', 'message': str(e), 'data_type': 'none',
+                         'data': '', 'data_str': '' }
+        out = encode(schemas.gpudb_schemas['gpudb_response']['RSP_SCHEMA'], response)
+
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(out)))
+        self.send_header('x-request-time-secs', '0.001')
+        self.end_headers()
+        self.wfile.write(out)
+
+
+class Server(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+
+    daemon_threads = True
+
+    def __init__(self, address, handler_class):
+        BaseHTTPServer.HTTPServer.__init__(self, address, handler_class)
+        self.connections_lock = threading.Lock()
+        self.connections = set() # open client sockets, closed by close_connections()
+
+    def process_request(self, request, client_address):
+        with self.connections_lock:
+            self.connections.add(request)
+        SocketServer.ThreadingMixIn.process_request(self, request, client_address)
+
+    def shutdown_request(self, request):
+        with self.connections_lock:
+            self.connections.discard(request)
+        BaseHTTPServer.HTTPServer.shutdown_request(self, request)
+
+    def handle_error(self, request, client_address):
+        pass # clients going away, e.g. cancelled hedged requests
+
+    def close_connections(self):
+        """Shut down the open connections, ending their handler threads."""
+        with self.connections_lock:
+            connections = list(self.connections)
+        for request in connections:
+            try:
+                request.shutdown(socket.SHUT_RDWR)
+            except socket.error:
+                pass
+
+
+class GPUdbTestServer:
+    """
+    Serves the endpoints in handlers, a dict of path (e.g. "/has/table") to a
+    function taking the decoded request dict and returning the response
+    dict; an exception it raises is sent as an ERROR response. Requests are
+    recorded in requests as (path, headers, request, body size).
+    """
+
+    def __init__(self, handlers, url_path=""):
+        self.handlers = handlers
+        self.url_path = url_path
+        self.lock = threading.Lock()
+        self.requests = []
+        self.delay = {}   # path -> seconds to wait before answering
+        self.drop = set() # paths answered by closing the connection
+
+        self.server = Server(('127.0.0.1', 0), Handler)
+        self.server.gpudb_server = self
+        self.port = self.server.server_address[1]
+        self.address = "127.0.0.1:%d%s" % (self.port, url_path)
+
+        self.thread = threading.Thread(target=self.server.serve_forever, name="GPUdbTestServer")
+        self.thread.daemon = True
+        self.thread.start()
+
+    def paths(self):
+        """Returns the paths of the requests received, in order."""
+        with self.lock:
+            return [ request[0] for request in self.requests ]
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.server.close_connections()
+        self.thread.join()
+
+# end class GPUdbTestServer
+
+
+# ---------------------------------------------------------------------------
+# Handlers for a server holding tables of encoded records.
+# ---------------------------------------------------------------------------
+
+class TableStore:
+    """Tables of binary encoded records of one type, with their handlers."""
+
+    def __init__(self, type_schema_str):
+        self.type_schema_str = type_schema_str
+        self.tables = collections.OrderedDict() # table name -> [encoded records]
+
+    def handlers(self):
+        return { '/has/table'      : self.has_table,
+                 '/show/table'     : self.show_table,
+                 '/get/records'    : self.get_records,
+                 '/insert/records' : self.insert_records }
+
+    def has_table(self, request):
+        return { 'table_name': request['table_name'],
+                 'table_exists': request['table_name'] in self.tables }
+
+    def show_table(self, request):
+        name = request['table_name']
+        records = self.tables.get(name, [])
+        return { 'table_name': name, 'table_names': [name], 'is_collection': [False],
+                 'is_view': [False], 'type_ids': ['1'], 'type_schemas': [self.type_schema_str],
+                 'type_labels': [''], 'properties': [{}], 'ttls': [-1],
+                 'sizes': [len(records)], 'full_sizes': [len(records)],
+                 'total_size': len(records), 'total_full_size': len(records) }
+
+    def get_records(self, request):
+        records = self.tables[request['table_name']]
+        offset = request['offset']
+        return { 'table_name': request['table_name'], 'type_name': '',
+                 'type_schema': self.type_schema_str,
+                 'records_binary': records[offset:offset + request['limit']],
+                 'records_json': [] }
+
+    def insert_records(self, request):
+        records = self.tables.setdefault(request['table_name'], [])
+        records.extend(request['list'])
+        return { 'record_ids': [], 'count_inserted': len(request['list']), 'count_updated': 0 }
+
+# end class TableStore
@@ -0,0 +1,122 @@
+# ---------------------------------------------------------------------------
+# test_async.py - AsyncGPUdb against a local server.
+#
+# Skipped unless the optional trollius package is installed.
+# ---------------------------------------------------------------------------
+
+import time
+import unittest
+
+from gpudb.gpudb import GPUdb, GPUdbRetryPolicy, GPUdbHedgingPolicy, BulkInserter
+from gpudb.gpudb import GPUdbConnectionError, GPUdbResponseError, GPUdbTimeoutError
+
+from gpudb_server import GPUdbTestServer, TableStore, free_port
+
+try:
+    import trollius
+    from gpudb.gpudb_async import AsyncGPUdb
+except ImportError:
+    trollius = None
+
+
+@unittest.skipIf(trollius is None, "AsyncGPUdb needs the trollius package")
+class AsyncGPUdbTest(unittest.TestCase):
+
+    def setUp(self):
+        self.store = TableStore(GPUdb.point_schema_str)
+        self.store.tables["t"] = []
+        self.server = GPUdbTestServer(self.store.handlers())
+        self.addCleanup(self.server.close)
+        self.loop = trollius.new_event_loop()
+        self.addCleanup(self.loop.close) # after the clients close
+
+    def make_client(self, hosts=None, **kwargs):
+        db = AsyncGPUdb(host=hosts or self.server.address, loop=self.loop, **kwargs)
+        self.addCleanup(db.close)
+        return db
+
+    def run_coroutine(self, coroutine):
+        return self.loop.run_until_complete(coroutine)
+
+    def test_endpoint_methods_return_coroutines_of_responses(self):
+        db = self.make_client()
+        records = [ db.encode_datum(GPUdb.point_schema_str, {"x": float(i), "y": 0.0, "OBJECT_ID": ""})
+                    for i in range(10) ]
+
+        response = self.run_coroutine(db.insert_records("t", records, None, {}))
+        self.assertEqual(response["count_inserted"], 10)
+
+        responses = self.run_coroutine(trollius.gather(
+            *[ db.get_records("t", i, 1) for i in range(10) ], loop=self.loop))
+        self.assertEqual([ r["records_binary"][0] for r in responses ], records)
+        self.assertTrue(db.get_pool_stats()["hits"] > 0)
+
+    def test_reads_fail_over_to_a_live_host(self):
+        db = self.make_client(["127.0.0.1:%d" % free_port(), self.server.address])
+
+        for i in range(2):
+            self.assertTrue(self.run_coroutine(db.has_table("t"))["table_exists"])
+        self.assertEqual(db.get_host_stats()["failovers"], 1)
+        self.assertEqual(self.server.paths(), ["/has/table", "/has/table"])
+
+    def test_every_host_down_raises_after_the_retries(self):
+        policy = GPUdbRetryPolicy(max_attempts=2, backoff=0.0)
+        db = self.make_client("127.0.0.1:%d" % free_port(), retry_policy=policy)
+
+        with self.assertRaises(GPUdbConnectionError) as raised:
+            self.run_coroutine(db.has_table("t"))
+        self.assertEqual(raised.exception.attempts, 2)
+
+    def test_read_timeout_from_request_options(self):
+        db = self.make_client()
+        self.server.delay["/has/table"] = 0.5
+
+        start = time.time()
+        with db.request_options(read_timeout=0.1, retry_policy=GPUdbRetryPolicy(max_attempts=1)):
+            coroutine = db.has_table("t")
+        self.assertRaises(GPUdbTimeoutError, self.run_coroutine, coroutine)
+        self.assertTrue(time.time() - start < 0.4)
+
+    def test_insert_is_not_resent_after_a_dropped_connection(self):
+        db = self.make_client()
+        self.run_coroutine(db.has_table("t")) # leaves a keep-alive connection
+        self.server.drop.add("/insert/records")
+
+        self.assertRaises(GPUdbResponseError, self.run_coroutine,
+                          db.insert_records("t", [], None, {}))
+        self.assertEqual(self.server.paths().count("/insert/records"), 1)
+
+    def test_slow_read_is_hedged_to_another_host(self):
+        slow = GPUdbTestServer(self.store.handlers())
+        self.addCleanup(slow.close)
+        slow.delay["/has/table"] = 0.5
+        hedging = GPUdbHedgingPolicy(min_samples=1)
+        hedging.record("/has/table", 0.01)
+        db = self.make_client([slow.address, self.server.address], hedging=hedging)
+
+        start = time.time()
+        self.assertTrue(self.run_coroutine(db.has_table("t"))["table_exists"])
+        self.assertTrue(time.time() - start < 0.4)
+        self.assertEqual(hedging.get_stats()["hedges_won"], 1)
+        self.assertEqual(db.get_host_stats()["failovers"], 0)
+
+    def test_metadata_cache(self):
+        db = self.make_client(metadata_cache_ttl=60)
+        for i in range(3):
+            self.assertTrue(self.run_coroutine(db.has_table("t"))["table_exists"])
+        self.assertEqual(self.server.paths(), ["/has/table"])
+        self.assertEqual(db.get_metadata_cache_stats()["hits"], 2)
+
+    def test_sync_only_helpers_raise_type_error(self):
+        db = self.make_client()
+        self.assertRaises(TypeError, db.iter_records, "t")
+        self.assertRaises(TypeError, db.insert_rows, "t", [])
+        self.assertRaises(TypeError, db.get_table_type_schema, "t")
+        self.assertRaises(TypeError, BulkInserter, db, "t", GPUdb.point_schema_str)
+        self.assertEqual(self.server.paths(), [])
+
+# end class AsyncGPUdbTest
+
+
+if __name__ == "__main__":
+    unittest.main()
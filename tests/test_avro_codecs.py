@@ -0,0 +1,460 @@
+# ---------------------------------------------------------------------------
+# test_avro_codecs.py - Compiled codecs, buffer encoder and decoder, schema
+# and plan caches, and the slots, lazy and projected record readers, checked
+# against the generic DatumWriter and DatumReader.
+# ---------------------------------------------------------------------------
+
+import cStringIO
+import math
+import pickle
+import unittest
+
+from gpudb.gpudb import GPUdb
+from gpudb.gpudb_records import select_columns
+from avro import io, schema
+
+
+ALL_TYPES_SCHEMA_STR = """{"type":"record","name":"everything","fields":[
+    {"name":"n","type":"null"},
+    {"name":"b","type":"boolean"},
+    {"name":"i","type":"int"},
+    {"name":"l","type":"long"},
+    {"name":"f","type":"float"},
+    {"name":"d","type":"double"},
+    {"name":"s","type":"string"},
+    {"name":"raw","type":"bytes"},
+    {"name":"fx","type":{"type":"fixed","name":"four","size":4}},
+    {"name":"e","type":{"type":"enum","name":"color","symbols":["RED","GREEN","BLUE"]}},
+    {"name":"a","type":{"type":"array","items":"long"}},
+    {"name":"ad","type":{"type":"array","items":"double"}},
+    {"name":"m","type":{"type":"map","values":"double"}},
+    {"name":"u","type":["null","string"]},
+    {"name":"inner","type":{"type":"record","name":"inner","fields":[
+        {"name":"k","type":"string"},{"name":"v","type":["null","double"]}]}},
+    {"name":"inners","type":{"type":"array","items":"inner"}}]}"""
+
+ALL_TYPES_SCHEMA = schema.parse(ALL_TYPES_SCHEMA_STR)
+
+LONGS = [ 0, 1, -1, 63, -64, 64, -65, 2047, -2048, 2048, -2049, 2 ** 31 - 1, -2 ** 31,
+          2 ** 62, io.LONG_MAX_VALUE, io.LONG_MIN_VALUE ]
+
+
+def make_datums():
+    datums = []
+    for i,value in enumerate(LONGS):
+        datums.append({ "n": None, "b": i % 2 == 0,
+                        "i": max(io.INT_MIN_VALUE, min(io.INT_MAX_VALUE, value)),
+                        "l": value, "f": 1.5 * i, "d": value / 3.0,
+                        "s": u"\u00e9t\u00e9 %d" % i * (i % 3), "raw": "\x00\xff" * i,
+                        "fx": "abc%d" % (i % 10), "e": ["RED", "GREEN", "BLUE"][i % 3],
+                        "a": LONGS[:i], "ad": [ j * 0.5 for j in range(i) ],
+                        "m": dict([ (u"k%d" % j, j * 1.25) for j in range(i % 4) ]),
+                        "u": None if i % 2 else u"set",
+                        "inner": { "k": u"x" * i, "v": None if i % 3 else -1.0 },
+                        "inners": [ { "k": u"%d" % j, "v": float(j) } for j in range(i % 3) ] })
+    return datums
+
+
+def generic_encode(SCHEMA, datum):
+    out = cStringIO.StringIO()
+    io.DatumWriter(SCHEMA).write(datum, io.BinaryEncoder(out))
+    return out.getvalue()
+
+def generic_decode(SCHEMA, encoded, readers_schema=None):
+    return io.DatumReader(SCHEMA, readers_schema).read(io.BinaryDecoder(cStringIO.StringIO(encoded)))
+
+def compiled_encode(SCHEMA, datum):
+    encoder = io.BinaryBufferEncoder(16)
+    io.compile_writer(SCHEMA)(datum, encoder)
+    return encoder.getvalue()
+
+def compiled_decode(SCHEMA, encoded, slots=False):
+    return io.compile_reader(SCHEMA, slots)(io.BinaryBufferDecoder(encoded))
+
+
+class CompiledCodecsTest(unittest.TestCase):
+
+    def test_compiled_writer_matches_datum_writer(self):
+        for datum in make_datums():
+            self.assertEqual(compiled_encode(ALL_TYPES_SCHEMA, datum),
+                             generic_encode(ALL_TYPES_SCHEMA, datum))
+
+    def test_compiled_reader_matches_datum_reader(self):
+        for datum in make_datums():
+            encoded = generic_encode(ALL_TYPES_SCHEMA, datum)
+            decoded = compiled_decode(ALL_TYPES_SCHEMA, encoded)
+            self.assertEqual(decoded, generic_decode(ALL_TYPES_SCHEMA, encoded))
+            self.assertEqual(decoded, datum)
+            self.assertEqual(decoded.keys(), [ field.name for field in ALL_TYPES_SCHEMA.fields ])
+
+    def test_special_doubles(self):
+        SCHEMA = schema.parse('{"type":"array","items":"double"}')
+        values = [ float("inf"), float("-inf"), -0.0, 5e-324, 1.7976931348623157e308 ]
+        encoded = compiled_encode(SCHEMA, values)
+        self.assertEqual(encoded, generic_encode(SCHEMA, values))
+        self.assertEqual(compiled_decode(SCHEMA, encoded), values)
+
+        nan = compiled_decode(SCHEMA, compiled_encode(SCHEMA, [ float("nan") ]))
+        self.assertTrue(math.isnan(nan[0]))
+
+    def test_endpoint_schemas_round_trip(self):
+        db = GPUdb()
+        REQ_SCHEMA,REP_SCHEMA = db.get_schemas("get_records")
+        request = { "table_name": u"t", "offset": 10, "limit": 1000, "encoding": u"binary",
+                    "options": { u"expression": u"x > 1" } }
+        encoded = db.write_datum(REQ_SCHEMA, request)
+        self.assertEqual(encoded, generic_encode(REQ_SCHEMA, request))
+        self.assertEqual(generic_decode(REQ_SCHEMA, encoded), request)
+
+    def test_compiled_codecs_are_kept_on_the_schema(self):
+        self.assertTrue(io.compile_reader(ALL_TYPES_SCHEMA) is io.compile_reader(ALL_TYPES_SCHEMA))
+        self.assertTrue(io.compile_writer(ALL_TYPES_SCHEMA) is io.compile_writer(ALL_TYPES_SCHEMA))
+        self.assertTrue(io.compile_reader(ALL_TYPES_SCHEMA, True) is not io.compile_reader(ALL_TYPES_SCHEMA))
+
+    def test_recursive_schema(self):
+        SCHEMA = schema.parse("""{"type":"record","name":"node","fields":[
+            {"name":"value","type":"long"},{"name":"next","type":["null","node"]}]}""")
+        datum = { "value": 1, "next": { "value": 2, "next": { "value": 3, "next": None } } }
+        encoded = compiled_encode(SCHEMA, datum)
+        self.assertEqual(encoded, generic_encode(SCHEMA, datum))
+        self.assertEqual(compiled_decode(SCHEMA, encoded), datum)
+
+    def test_truncated_record_raises_eof(self):
+        encoded = generic_encode(ALL_TYPES_SCHEMA, make_datums()[5])
+        for size in (0, 1, 5, 20, len(encoded) - 1):
+            self.assertRaises(EOFError, compiled_decode, ALL_TYPES_SCHEMA, encoded[:size])
+
+    def test_bad_enum_and_union_index(self):
+        SCHEMA = schema.parse('{"type":"enum","name":"c","symbols":["A","B"]}')
+        self.assertRaises(io.SchemaResolutionException, compiled_decode, SCHEMA, "\x08")
+        writer = io.DatumWriter(SCHEMA, validate=False)
+        self.assertRaises(io.AvroTypeException, writer.write, "C", io.BinaryBufferEncoder())
+
+# end class CompiledCodecsTest
+
+
+class BufferEncoderDecoderTest(unittest.TestCase):
+
+    def write_both(self, method, values):
+        out = cStringIO.StringIO()
+        generic = io.BinaryEncoder(out)
+        buffered = io.BinaryBufferEncoder(1) # grows from one byte
+        for value in values:
+            getattr(generic, method)(value)
+            getattr(buffered, method)(value)
+        self.assertEqual(buffered.getvalue(), out.getvalue())
+        self.assertEqual(buffered.tell(), len(out.getvalue()))
+        return buffered.getvalue()
+
+    def read_both(self, method, encoded, count):
+        generic = io.BinaryDecoder(cStringIO.StringIO(encoded))
+        buffered = io.BinaryBufferDecoder(encoded)
+        values = [ getattr(buffered, method)() for i in range(count) ]
+        self.assertEqual(values, [ getattr(generic, method)() for i in range(count) ])
+        self.assertEqual(buffered.tell(), len(encoded))
+        return values
+
+    def test_longs(self):
+        values = LONGS + range(-3000, 3000, 7)
+        encoded = self.write_both("write_long", values)
+        self.assertEqual(self.read_both("read_long", encoded, len(values)), values)
+
+        decoder = io.BinaryBufferDecoder(encoded)
+        for i in values:
+            decoder.skip_long()
+        self.assertEqual(decoder.tell(), len(encoded))
+
+    def test_floats_and_doubles(self):
+        doubles = [ 0.0, -1.5, 1e300, -1e-300, float("inf"), 3.141592653589793 ]
+        encoded = self.write_both("write_double", doubles)
+        self.assertEqual(self.read_both("read_double", encoded, len(doubles)), doubles)
+        self.assertEqual(list(io.BinaryBufferDecoder(encoded).read_double_block(len(doubles))), doubles)
+
+        floats = [ 0.0, -1.5, 0.25, 65504.0 ]
+        encoded = self.write_both("write_float", floats)
+        self.assertEqual(self.read_both("read_float", encoded, len(floats)), floats)
+        self.assertEqual(list(io.BinaryBufferDecoder(encoded).read_float_block(len(floats))), floats)
+
+    def test_strings_bytes_and_booleans(self):
+        strings = [ u"", u"a", u"\u00e9\u4e2d", u"x" * 5000 ]
+        encoded = self.write_both("write_utf8", strings)
+        self.assertEqual(self.read_both("read_utf8", encoded, len(strings)), strings)
+
+        raw = [ "", "\x00", "\xff" * 300 ]
+        encoded = self.write_both("write_bytes", raw)
+        self.assertEqual(self.read_both("read_bytes", encoded, len(raw)), raw)
+
+        decoder = io.BinaryBufferDecoder(encoded)
+        decoder.skip_bytes()
+        decoder.skip_utf8()
+        self.assertEqual(decoder.read_bytes(), raw[2])
+
+        encoded = self.write_both("write_boolean", [True, False, True])
+        self.assertEqual(self.read_both("read_boolean", encoded, 3), [True, False, True])
+
+    def test_decoder_offset_seek_and_buffer(self):
+        encoded = "junk" + compiled_encode(ALL_TYPES_SCHEMA, make_datums()[3])
+        decoder = io.BinaryBufferDecoder(buffer(encoded), 4)
+        self.assertEqual(io.compile_reader(ALL_TYPES_SCHEMA)(decoder), make_datums()[3])
+        self.assertEqual(decoder.tell(), len(encoded))
+
+        decoder.seek(-2, 2)
+        self.assertEqual(decoder.tell(), len(encoded) - 2)
+        decoder.seek(1, 1)
+        self.assertEqual(decoder.tell(), len(encoded) - 1)
+
+    def test_reads_past_the_end_raise_eof(self):
+        for encoded,method in (("", "read_boolean"), ("\x80", "read_long"), ("\x80\x80", "skip_long"),
+                               ("abc", "read_float"), ("abcdefg", "read_double"),
+                               ("\x10abc", "read_bytes"), ("\x04\xc3", "read_utf8")):
+            decoder = io.BinaryBufferDecoder(encoded)
+            self.assertRaises(EOFError, getattr(decoder, method))
+        self.assertRaises(EOFError, io.BinaryBufferDecoder("a" * 15).read_double_block, 2)
+        self.assertRaises(EOFError, io.BinaryBufferDecoder("a" * 7).read_float_block, 2)
+        self.assertRaises(EOFError, io.BinaryBufferDecoder("ab").read, 3)
+
+    def test_encoder_truncate_and_reuse(self):
+        encoder = io.BinaryBufferEncoder(4)
+        encoder.write_utf8(u"hello world")
+        encoder.truncate()
+        self.assertEqual(encoder.getvalue(), "")
+        encoder.write_long(1)
+        self.assertEqual(encoder.getvalue(), "\x02")
+
+# end class BufferEncoderDecoderTest
+
+
+class ValidateTest(unittest.TestCase):
+
+    BAD_DATUMS = [ ("i", 2 ** 40), ("s", 5), ("raw", None), ("e", "PURPLE"), ("a", [1.5]),
+                   ("inner", { "k": 1, "v": None }) ]
+
+    def test_no_validation_raises_the_same_exception(self):
+        for name,value in self.BAD_DATUMS:
+            datum = dict(make_datums()[4], **{ name: value })
+            with self.assertRaises(io.AvroTypeException) as validated:
+                io.DatumWriter(ALL_TYPES_SCHEMA).write(datum, io.BinaryBufferEncoder())
+            if name == "i": # written unchecked, out of range ints are not caught
+                continue
+            with self.assertRaises(io.AvroTypeException) as unvalidated:
+                io.DatumWriter(ALL_TYPES_SCHEMA, validate=False).write(datum, io.BinaryBufferEncoder())
+            self.assertEqual(str(unvalidated.exception), str(validated.exception))
+
+    def test_client_validate_option(self):
+        datum = make_datums()[6]
+        checked = GPUdb(validate=True)
+        unchecked = GPUdb(validate=False)
+        self.assertEqual(unchecked.write_datum(ALL_TYPES_SCHEMA, datum),
+                         checked.write_datum(ALL_TYPES_SCHEMA, datum))
+
+        bad = dict(datum, s=5)
+        self.assertRaises(io.AvroTypeException, checked.write_datum, ALL_TYPES_SCHEMA, bad)
+        self.assertRaises(io.AvroTypeException, unchecked.write_datum, ALL_TYPES_SCHEMA, bad)
+
+    def test_validate(self):
+        datum = make_datums()[2]
+        self.assertTrue(io.validate(ALL_TYPES_SCHEMA, datum))
+        for name,value in self.BAD_DATUMS:
+            self.assertFalse(io.validate(ALL_TYPES_SCHEMA, dict(datum, **{ name: value })))
+
+# end class ValidateTest
+
+
+class SchemaCacheTest(unittest.TestCase):
+
+    def test_parse_cached_shares_the_schema(self):
+        self.assertTrue(schema.parse_cached(ALL_TYPES_SCHEMA_STR) is schema.parse_cached(ALL_TYPES_SCHEMA_STR))
+        self.assertTrue(schema.parse(ALL_TYPES_SCHEMA_STR) is not schema.parse(ALL_TYPES_SCHEMA_STR))
+
+    def test_lru_eviction_and_stats(self):
+        cache = schema.SchemaCache(max_size=2)
+        strs = [ '{"type":"array","items":"%s"}' % t for t in ("int", "long", "double") ]
+        first = cache.parse(strs[0])
+        cache.parse(strs[1])
+        self.assertTrue(cache.parse(strs[0]) is first) # now the most recently used
+        cache.parse(strs[2])                            # evicts strs[1]
+        self.assertTrue(cache.parse(strs[0]) is first)
+
+        stats = cache.get_stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["size"]), (2, 3, 2))
+        cache.parse(strs[1])
+        self.assertEqual(cache.get_stats()["misses"], 4)
+
+    def test_bad_schema_is_not_cached(self):
+        cache = schema.SchemaCache()
+        self.assertRaises(schema.SchemaParseException, cache.parse, '{"type":"nope"}')
+        self.assertEqual(cache.get_stats()["size"], 0)
+
+    def test_artifacts_are_built_once_and_not_pickled(self):
+        SCHEMA = schema.parse(ALL_TYPES_SCHEMA_STR)
+        built = []
+        build = lambda s: built.append(s) or len(built)
+        self.assertEqual(SCHEMA.get_artifact("test", build), 1)
+        self.assertEqual(SCHEMA.get_artifact("test", build), 1)
+        self.assertEqual(len(built), 1)
+
+        io.compile_reader(SCHEMA)
+        copied = pickle.loads(pickle.dumps(SCHEMA))
+        self.assertEqual(copied._artifacts, {})
+        self.assertEqual(compiled_decode(copied, generic_encode(SCHEMA, make_datums()[1])), make_datums()[1])
+
+    def test_endpoint_schemas_are_shared_by_clients(self):
+        self.assertTrue(GPUdb().get_schemas("show_table")[0] is GPUdb().get_schemas("show_table")[0])
+
+    def test_fields_dict_is_kept_and_read_only(self):
+        fields_dict = ALL_TYPES_SCHEMA.fields_dict
+        self.assertTrue(ALL_TYPES_SCHEMA.fields_dict is fields_dict)
+        self.assertEqual(sorted(fields_dict.keys()), sorted([ f.name for f in ALL_TYPES_SCHEMA.fields ]))
+        self.assertRaises(TypeError, fields_dict.__setitem__, "x", None)
+
+# end class SchemaCacheTest
+
+
+class RecordPlanTest(unittest.TestCase):
+
+    WRITER = schema.parse("""{"type":"record","name":"r","fields":[
+        {"name":"a","type":"int"},{"name":"dropped","type":"string"},{"name":"b","type":"long"}]}""")
+    READER = schema.parse("""{"type":"record","name":"r","fields":[
+        {"name":"b","type":"double"},{"name":"a","type":"long"},
+        {"name":"added","type":"string","default":"none"}]}""")
+
+    def test_resolution(self):
+        encoded = generic_encode(self.WRITER, { "a": 7, "dropped": u"xyz", "b": 2 ** 40 })
+        for i in range(2): # the second read uses the kept plan
+            decoded = generic_decode(self.WRITER, encoded, self.READER)
+            self.assertEqual(decoded, { "a": 7, "b": float(2 ** 40), "added": u"none" })
+            self.assertTrue(isinstance(decoded["b"], float))
+        self.assertTrue(self.READER in self.WRITER.get_artifact("record_plans", None))
+
+    def test_missing_default_raises(self):
+        reader = schema.parse("""{"type":"record","name":"r","fields":[{"name":"c","type":"int"}]}""")
+        encoded = generic_encode(self.WRITER, { "a": 7, "dropped": u"", "b": 1 })
+        self.assertRaises(io.SchemaResolutionException, generic_decode, self.WRITER, encoded, reader)
+
+# end class RecordPlanTest
+
+
+class SlotsRecordTest(unittest.TestCase):
+
+    def test_decoded_records(self):
+        for datum in make_datums()[:6]:
+            encoded = generic_encode(ALL_TYPES_SCHEMA, datum)
+            record = compiled_decode(ALL_TYPES_SCHEMA, encoded, slots=True)
+            self.assertTrue(isinstance(record, io.Record))
+            self.assertEqual(record, datum)
+            self.assertEqual(record, compiled_decode(ALL_TYPES_SCHEMA, encoded))
+            self.assertEqual(record.inner["k"], datum["inner"]["k"])
+            self.assertEqual(record.keys(), [ f.name for f in ALL_TYPES_SCHEMA.fields ])
+            self.assertEqual(record.to_dict(), datum)
+
+            reader = io.DatumReader(ALL_TYPES_SCHEMA, slots=True)
+            self.assertEqual(reader.read(io.BinaryBufferDecoder(encoded)), record)
+
+    def test_item_access(self):
+        cls = io.record_class(ALL_TYPES_SCHEMA)
+        self.assertTrue(io.record_class(ALL_TYPES_SCHEMA) is cls)
+        record = cls(None, True, 3)
+        self.assertEqual((record["i"], record.i, record.get("l"), record.get("zz", 5)), (3, 3, None, 5))
+        record["l"] = 9
+        self.assertEqual(record.l, 9)
+        self.assertRaises(KeyError, record.__getitem__, "zz")
+        self.assertRaises(AttributeError, setattr, record, "zz", 1)
+        self.assertTrue("s" in record and "zz" not in record)
+        self.assertEqual(len(record), len(ALL_TYPES_SCHEMA.fields))
+
+    def test_pickle(self):
+        datum = make_datums()[7]
+        record = compiled_decode(ALL_TYPES_SCHEMA, generic_encode(ALL_TYPES_SCHEMA, datum), slots=True)
+        self.assertEqual(pickle.loads(pickle.dumps(record, 2)), record)
+
+    def test_fields_that_cannot_be_slots(self):
+        for name in ("my field", "keys", "__x", "_fields"):
+            SCHEMA = schema.parse('{"type":"record","name":"r","fields":[{"name":"%s","type":"int"}]}' % name)
+            self.assertTrue(io.record_class(SCHEMA) is None)
+            decoded = compiled_decode(SCHEMA, "\x02", slots=True)
+            self.assertEqual(decoded, { name: 1 })
+            self.assertFalse(isinstance(decoded, io.Record))
+
+# end class SlotsRecordTest
+
+
+class LazyRecordTest(unittest.TestCase):
+
+    def test_values_match_the_full_decode(self):
+        for datum in make_datums():
+            encoded = generic_encode(ALL_TYPES_SCHEMA, datum)
+            record = io.LazyRecord(ALL_TYPES_SCHEMA, encoded)
+            self.assertEqual(record, datum)
+            self.assertEqual(record.to_dict(), compiled_decode(ALL_TYPES_SCHEMA, encoded))
+            self.assertEqual(record.raw, encoded)
+
+    def test_fields_are_decoded_on_access_only(self):
+        datum = make_datums()[8]
+        record = io.LazyRecord(ALL_TYPES_SCHEMA, generic_encode(ALL_TYPES_SCHEMA, datum))
+        self.assertEqual(record["inner"], datum["inner"])
+        self.assertEqual(record._values.keys(), [ record.keys().index("inner") ])
+        self.assertEqual(record.l, datum["l"])
+        self.assertEqual(sorted(record._values.keys()), [3, 14])
+        self.assertEqual(record.get("zz", 1), 1)
+        self.assertRaises(KeyError, record.__getitem__, "zz")
+        self.assertRaises(AttributeError, getattr, record, "zz")
+
+    def test_offset_into_a_shared_buffer(self):
+        datums = make_datums()[:4]
+        encoded = [ generic_encode(ALL_TYPES_SCHEMA, datum) for datum in datums ]
+        page = "".join(encoded)
+        offset = 0
+        for datum,part in zip(datums, encoded):
+            record = io.LazyRecord(ALL_TYPES_SCHEMA, page, offset)
+            self.assertEqual(record.s, datum["s"])
+            self.assertEqual(record.raw, part)
+            offset += len(part)
+
+    def test_pickle_and_truncation(self):
+        datum = make_datums()[9]
+        encoded = generic_encode(ALL_TYPES_SCHEMA, datum)
+        self.assertEqual(pickle.loads(pickle.dumps(io.LazyRecord(ALL_TYPES_SCHEMA, encoded))), datum)
+        self.assertRaises(EOFError, io.LazyRecord(ALL_TYPES_SCHEMA, encoded[:30]).get, "inners")
+
+# end class LazyRecordTest
+
+
+class ProjectionTest(unittest.TestCase):
+
+    def test_projected_fields_in_the_order_given(self):
+        columns = ["inner", "s", "l", "s", "fx"]
+        read = io.compile_projected_reader(ALL_TYPES_SCHEMA, columns)
+        self.assertTrue(io.compile_projected_reader(ALL_TYPES_SCHEMA, columns) is read)
+        for datum in make_datums():
+            encoded = generic_encode(ALL_TYPES_SCHEMA, datum)
+            decoded = read(io.BinaryBufferDecoder(encoded))
+            self.assertEqual(decoded.keys(), ["inner", "s", "l", "fx"])
+            self.assertEqual(decoded, dict([ (name, datum[name]) for name in decoded ]))
+
+            slots = io.compile_projected_reader(ALL_TYPES_SCHEMA, columns, True)(io.BinaryBufferDecoder(encoded))
+            self.assertEqual(slots, decoded)
+
+    def test_skips_leave_the_decoder_at_the_end(self):
+        encoded = generic_encode(ALL_TYPES_SCHEMA, make_datums()[10])
+        decoder = io.BinaryBufferDecoder(encoded + "tail")
+        io.compile_projected_reader(ALL_TYPES_SCHEMA, ["b"])(decoder)
+        self.assertEqual(decoder.tell(), len(encoded))
+
+    def test_read_orig_datum_columns(self):
+        db = GPUdb()
+        datum = make_datums()[11]
+        encoded = generic_encode(ALL_TYPES_SCHEMA, datum)
+        self.assertEqual(db.read_orig_datum(ALL_TYPES_SCHEMA, encoded, columns=["d", "e"]),
+                         { "d": datum["d"], "e": datum["e"] })
+        self.assertRaises(ValueError, db.read_orig_datum, ALL_TYPES_SCHEMA, encoded, None, ["nope"])
+
+    def test_select_columns(self):
+        self.assertEqual(select_columns(["b", "a", "b"], ["a", "b"]), ["b", "a"])
+        self.assertRaises(ValueError, select_columns, ["a", "c"], ["a", "b"])
+        self.assertRaises(schema.AvroException, ALL_TYPES_SCHEMA.project, ["nope"])
+
+# end class ProjectionTest
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,100 @@
+# ---------------------------------------------------------------------------
+# test_export_table.py - export_table() against a local server.
+# ---------------------------------------------------------------------------
+
+import csv
+import cStringIO
+import time
+import unittest
+
+from gpudb.gpudb import GPUdb
+
+from gpudb_server import GPUdbTestServer, TableStore, encode
+
+from avro import schema
+
+
+SCHEMA = schema.parse(GPUdb.point_schema_str)
+
+ROWS = [ { "x": float(i), "y": -0.5 * i, "OBJECT_ID": u"r\u00e9cord %d" % i } for i in range(95) ]
+
+
+class ExportTableTest(unittest.TestCase):
+
+    def setUp(self):
+        self.store = TableStore(GPUdb.point_schema_str)
+        self.store.tables["t"] = [ encode(SCHEMA, row) for row in ROWS ]
+        handlers = self.store.handlers()
+        handlers["/get/records"] = self.get_records
+        self.first_page_delay = 0
+
+        self.server = GPUdbTestServer(handlers)
+        self.addCleanup(self.server.close)
+        self.db = GPUdb(host=self.server.address)
+        self.addCleanup(self.db.connection_pool.clear)
+
+    def get_records(self, request):
+        if request["offset"] == 0:
+            time.sleep(self.first_page_delay)
+        return self.store.get_records(request)
+
+    def export(self, sink, **kwargs):
+        kwargs.setdefault("decode_processes", 0)
+        return self.db.export_table("t", sink, page_size=10, **kwargs)
+
+    def test_ordered(self):
+        self.first_page_delay = 0.2
+        records = []
+        stats = self.export(records, workers=3)
+        self.assertEqual([ dict(record) for record in records ], ROWS)
+
+        self.assertEqual(stats["records"], len(ROWS))
+        self.assertEqual(stats["pages"], 10)
+        self.assertEqual(stats["bytes"], sum([ len(record) for record in self.store.tables["t"] ]))
+        self.assertTrue(stats["seconds"] > 0)
+        self.assertTrue(stats["records_per_sec"] > 0)
+
+    def test_unordered_writes_pages_as_they_are_decoded(self):
+        self.first_page_delay = 0.2
+        records = []
+        stats = self.export(records.append, workers=3, ordered=False)
+
+        self.assertEqual(sorted([ record["x"] for record in records ]), [ row["x"] for row in ROWS ])
+        # The slow first page is written after the pages fetched meanwhile
+        first_page = [ record["x"] for record in records ].index(0.0)
+        self.assertTrue(first_page >= 10)
+        self.assertEqual([ record["x"] for record in records[first_page:first_page + 10] ],
+                         [ row["x"] for row in ROWS[:10] ])
+        self.assertEqual(stats["records"], len(ROWS))
+
+    def test_decode_processes(self):
+        records = []
+        self.export(records, workers=2, decode_processes=2)
+        self.assertEqual([ dict(record) for record in records ], ROWS)
+
+    def test_csv_writer_with_non_ascii_strings(self):
+        out = cStringIO.StringIO()
+        self.export(csv.writer(out), columns=["OBJECT_ID", "x"])
+        rows = list(csv.reader(cStringIO.StringIO(out.getvalue())))
+        self.assertEqual(rows, [ [ row["OBJECT_ID"].encode("utf-8"), repr(row["x"]) ] for row in ROWS ])
+
+        out = cStringIO.StringIO()
+        self.export(csv.DictWriter(out, ["x", "y", "OBJECT_ID"]))
+        rows = list(csv.DictReader(cStringIO.StringIO(out.getvalue()), ["x", "y", "OBJECT_ID"]))
+        self.assertEqual([ row["OBJECT_ID"].decode("utf-8") for row in rows ],
+                         [ row["OBJECT_ID"] for row in ROWS ])
+
+    def test_progress_and_empty_table(self):
+        reports = []
+        self.export([], progress=lambda stats: reports.append(dict(stats)))
+        self.assertEqual(reports[-1]["records"], len(ROWS))
+
+        self.store.tables["empty"] = []
+        stats = self.db.export_table("empty", [], decode_processes=0)
+        self.assertEqual((stats["records"], stats["pages"]), (0, 0))
+
+# end class ExportTableTest
+
+
+if __name__ == "__main__":
+    unittest.main()
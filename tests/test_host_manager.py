@@ -0,0 +1,209 @@
+# ---------------------------------------------------------------------------
+# test_host_manager.py - Head node failover, cooldown and request routing.
+#
+# Run from the repository root with: python -m unittest discover tests
+# ---------------------------------------------------------------------------
+
+import time
+import unittest
+
+from gpudb.gpudb import GPUdb, GPUdbHost, GPUdbHostManager
+from gpudb.gpudb import GPUdbConnectionError, GPUdbRetryPolicy
+
+
+def make_manager(num_hosts=3, balance="round_robin", cooldown=30.0, write_failover=False):
+    hosts = [ GPUdbHost("10.0.0.%d" % (i + 1), 9191) for i in range(num_hosts) ]
+    return GPUdbHostManager(hosts, balance, cooldown, write_failover)
+
+
+class FakeResponse:
+    """Stands in for an httplib.HTTPResponse in post_to_gpudb_read."""
+
+    def getheader(self, name, default=None):
+        return default
+
+
+class HostManagerTest(unittest.TestCase):
+
+    def test_writes_go_to_the_primary(self):
+        manager = make_manager()
+        for i in range(5):
+            host = manager.acquire(False)
+            manager.release(host, True)
+            self.assertTrue(host is manager.hosts[0])
+
+    def test_reads_round_robin_over_all_hosts(self):
+        manager = make_manager()
+        chosen = []
+        for i in range(6):
+            host = manager.acquire(True)
+            manager.release(host, True)
+            chosen.append(host)
+        self.assertEqual(chosen, manager.hosts * 2)
+
+    def test_reads_prefer_least_outstanding(self):
+        manager = make_manager(balance="least_outstanding")
+        busy = [ manager.acquire(True), manager.acquire(True) ]
+        host = manager.acquire(True)
+        self.assertTrue(host not in busy)
+        manager.release(busy[0], True)
+        self.assertTrue(manager.acquire(True) is busy[0])
+
+    def test_writes_stay_on_a_failed_primary(self):
+        manager = make_manager()
+        primary = manager.hosts[0]
+        host = manager.acquire(False)
+        manager.release(host, False)
+
+        # No other host to fail over to, and later writes keep to the primary
+        self.assertTrue(manager.acquire(False, [primary]) is None)
+        host = manager.acquire(False)
+        manager.release(host, True)
+        self.assertTrue(host is primary)
+        self.assertEqual(manager.get_candidates(False), [primary])
+
+        stats = manager.get_stats()
+        self.assertEqual(stats["failovers"], 0)
+        self.assertEqual(stats["hosts"][0]["errors"], 1)
+
+    def test_reads_avoid_a_failed_host_and_count_failovers(self):
+        manager = make_manager()
+        primary = manager.hosts[0]
+        host = manager.acquire(True)
+        manager.release(host, False)
+        self.assertTrue(host is primary)
+
+        retry = manager.acquire(True, [primary])
+        manager.release(retry, True)
+        self.assertTrue(retry is not primary)
+
+        # Later reads skip the primary while it cools down
+        for i in range(4):
+            host = manager.acquire(True)
+            manager.release(host, True)
+            self.assertTrue(host is not primary)
+
+        stats = manager.get_stats()
+        self.assertEqual(stats["failovers"], 1)
+        self.assertFalse(stats["hosts"][0]["healthy"])
+        self.assertEqual(stats["hosts"][0]["errors"], 1)
+
+    def test_write_failover_is_opt_in(self):
+        manager = make_manager(write_failover=True)
+        primary = manager.hosts[0]
+        host = manager.acquire(False)
+        manager.release(host, False)
+
+        retry = manager.acquire(False, [primary])
+        manager.release(retry, True)
+        self.assertTrue(retry is manager.hosts[1])
+
+        host = manager.acquire(False)
+        manager.release(host, True)
+        self.assertTrue(host is manager.hosts[1])
+        self.assertEqual(manager.get_stats()["failovers"], 1)
+
+    def test_cooldown_expires(self):
+        manager = make_manager(num_hosts=2, cooldown=0.05)
+        primary = manager.hosts[0]
+        manager.release(manager.acquire(True), False)
+        self.assertTrue(manager.acquire(True) is not primary)
+        self.assertTrue(manager.acquire(True) is not primary)
+
+        time.sleep(0.1)
+        self.assertTrue(primary in [ manager.acquire(True), manager.acquire(True) ])
+
+    def test_all_hosts_down_uses_the_one_back_soonest(self):
+        manager = make_manager(num_hosts=2)
+        manager.hosts[0].down_until = time.time() + 20
+        manager.hosts[1].down_until = time.time() + 10
+
+        self.assertTrue(manager.acquire(True) is manager.hosts[1])
+        self.assertTrue(manager.acquire(True, manager.hosts) is None)
+        self.assertTrue(manager.acquire(False) is manager.hosts[0])
+
+    def test_hedges_are_not_failovers(self):
+        manager = make_manager()
+        primary = manager.hosts[0]
+        self.assertTrue(manager.acquire_hedge(primary, False) is primary)
+        self.assertTrue(manager.acquire_hedge(primary, True) is not primary)
+        self.assertEqual(manager.get_stats()["failovers"], 0)
+
+# end class HostManagerTest
+
+
+class ClientFailoverTest(unittest.TestCase):
+
+    def make_client(self, hosts, **kwargs):
+        gpudb = GPUdb(host=hosts, **kwargs)
+        self.sent = [] # (host, headers) of each request
+
+        def send_request(url, body_data, headers, host=None, attempt=None):
+            self.sent.append((host, headers))
+            if host.host in self.down:
+                raise GPUdbConnectionError("Connection refused", host.host, url)
+            return FakeResponse(),"response"
+
+        gpudb.send_request = send_request
+        return gpudb
+
+    def test_read_fails_over_to_the_next_host(self):
+        self.down = set(["10.0.0.1"])
+        gpudb = self.make_client(["10.0.0.1:9191", "10.0.0.2:9191"])
+
+        resp_data,resp_time = gpudb.post_to_gpudb_read("", "/filter")
+        self.assertEqual(resp_data, "response")
+        self.assertEqual([ host.host for host,headers in self.sent ], ["10.0.0.1", "10.0.0.2"])
+
+        stats = gpudb.get_host_stats()
+        self.assertEqual(stats["failovers"], 1)
+        self.assertFalse(stats["hosts"][0]["healthy"])
+        self.assertTrue(stats["hosts"][1]["healthy"])
+
+    def test_write_to_a_failed_primary_raises_after_the_retries(self):
+        self.down = set(["10.0.0.1"])
+        policy = GPUdbRetryPolicy(max_attempts=2, backoff=0.0)
+        gpudb = self.make_client(["10.0.0.1:9191", "10.0.0.2:9191"], retry_policy=policy)
+
+        with self.assertRaises(GPUdbConnectionError) as raised:
+            gpudb.post_to_gpudb_read("", "/insert/records")
+        self.assertEqual(raised.exception.attempts, 2)
+        self.assertEqual([ host.host for host,headers in self.sent ], ["10.0.0.1", "10.0.0.1"])
+        self.assertEqual(gpudb.get_host_stats()["failovers"], 0)
+
+    def test_write_failover_when_enabled(self):
+        self.down = set(["10.0.0.1"])
+        gpudb = self.make_client(["10.0.0.1:9191", "10.0.0.2:9191"], write_failover=True)
+
+        resp_data,resp_time = gpudb.post_to_gpudb_read("", "/insert/records")
+        self.assertEqual(resp_data, "response")
+        self.assertEqual([ host.host for host,headers in self.sent ], ["10.0.0.1", "10.0.0.2"])
+        self.assertEqual(gpudb.get_host_stats()["failovers"], 1)
+
+    def test_every_host_down_raises_after_the_retries(self):
+        self.down = set(["10.0.0.1", "10.0.0.2"])
+        policy = GPUdbRetryPolicy(max_attempts=2, backoff=0.0)
+        gpudb = self.make_client(["10.0.0.1:9191", "10.0.0.2:9191"], retry_policy=policy)
+
+        self.assertRaises(GPUdbConnectionError, gpudb.post_to_gpudb_read, "", "/show/table")
+        self.assertEqual(len(self.sent), 4)
+
+    def test_each_host_gets_its_own_credentials(self):
+        self.down = set()
+        gpudb = self.make_client(["http://alice:a@10.0.0.1:9191", "10.0.0.2:9191",
+                                  "http://bob:b@10.0.0.3:9191"])
+        for i in range(3):
+            gpudb.post_to_gpudb_read("", "/show/table")
+
+        auth = dict([ (host.host, host.authorize(headers).get("Authorization"))
+                      for host,headers in self.sent ])
+        alice = GPUdbHost("http://alice:a@x").authorization
+        self.assertEqual(auth["10.0.0.1"], alice)
+        self.assertEqual(auth["10.0.0.2"], alice) # no credentials of its own
+        self.assertEqual(auth["10.0.0.3"], GPUdbHost("http://bob:b@x").authorization)
+
+# end class ClientFailoverTest
+
+
+if __name__ == "__main__":
+    unittest.main()
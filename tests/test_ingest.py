@@ -0,0 +1,185 @@
+# ---------------------------------------------------------------------------
+# test_ingest.py - BulkInserter and InsertPipeline against a local server.
+# ---------------------------------------------------------------------------
+
+import time
+import unittest
+
+from gpudb.gpudb import GPUdb, BulkInserter, InsertPipeline
+from avro import schema
+
+from gpudb_server import GPUdbTestServer, TableStore, decode
+
+
+POINT_SCHEMA = schema.parse_cached(GPUdb.point_schema_str)
+
+
+def point(i):
+    return { "x": float(i), "y": 0.0, "OBJECT_ID": "" }
+
+
+class IngestTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.store = TableStore(GPUdb.point_schema_str)
+        self.store.tables["t"] = []
+        self.fail_batches = set()  # first x of the batches answered with an error
+        self.batch_delays = {}     # first x of a batch -> seconds to wait
+        handlers = self.store.handlers()
+        handlers["/insert/records"] = self.insert_records
+        self.server = GPUdbTestServer(handlers)
+        self.addCleanup(self.server.close)
+        self.db = GPUdb(host=self.server.address)
+        self.addCleanup(self.db.connection_pool.clear)
+
+    def insert_records(self, request):
+        first = self.first_x(request["list"])
+        time.sleep(self.batch_delays.get(first, 0))
+        if first in self.fail_batches:
+            raise ValueError("batch %s rejected" % first)
+        return self.store.insert_records(request)
+
+    def first_x(self, encoded):
+        if len(encoded) == 0:
+            return None
+        return int(decode(POINT_SCHEMA, encoded[0])["x"])
+
+    def inserted_xs(self):
+        return [ self.first_x([record]) for record in self.store.tables["t"] ]
+
+    def batch_sizes(self):
+        return [ len(request[2]["list"]) for request in self.server.requests
+                 if request[0] == "/insert/records" ]
+
+# end class IngestTestCase
+
+
+class BulkInserterTest(IngestTestCase):
+
+    def test_flushes_on_batch_size(self):
+        inserter = BulkInserter(self.db, "t", GPUdb.point_schema_str, batch_size=4)
+        for i in range(10):
+            inserter.add(point(i))
+        self.assertEqual(self.batch_sizes(), [4, 4])
+        inserter.close()
+        self.assertEqual(self.batch_sizes(), [4, 4, 2])
+        self.assertEqual(self.inserted_xs(), range(10))
+        self.assertEqual((inserter.count_inserted, inserter.num_flushes), (10, 3))
+
+    def test_flushes_on_bytes(self):
+        size = len(self.db.write_datum(POINT_SCHEMA, point(0)))
+        with BulkInserter(self.db, "t", GPUdb.point_schema_str, max_bytes=3 * size) as inserter:
+            inserter.add_many(point(i) for i in range(7))
+            self.assertEqual(self.batch_sizes(), [3, 3])
+        self.assertEqual(self.batch_sizes(), [3, 3, 1])
+
+    def test_flushes_on_latency(self):
+        inserter = BulkInserter(self.db, "t", GPUdb.point_schema_str, max_latency=0.1)
+        self.addCleanup(inserter.close)
+        inserter.add(point(1))
+        inserter.add(point(2))
+        end_time = time.time() + 2
+        while (len(self.store.tables["t"]) < 2) and (time.time() < end_time):
+            time.sleep(0.01)
+        self.assertEqual(self.batch_sizes(), [2])
+
+    def test_failed_batch_stays_buffered(self):
+        self.fail_batches.add(0)
+        inserter = BulkInserter(self.db, "t", GPUdb.point_schema_str, batch_size=2)
+        inserter.add(point(0))
+        self.assertRaises(ValueError, inserter.add, point(1))
+        self.assertEqual(self.store.tables["t"], [])
+
+        self.fail_batches.clear()
+        inserter.add(point(2)) # 0, 1 and 2 go in the next flush
+        self.assertEqual(self.inserted_xs(), [0, 1, 2])
+        inserter.close()
+
+        self.fail_batches.add(3)
+        inserter = BulkInserter(self.db, "t", GPUdb.point_schema_str)
+        inserter.add(point(3))
+        self.assertRaises(ValueError, inserter.close)
+        self.assertEqual(len(inserter.take_records()), 1)
+        self.assertEqual(inserter.flush(), None)
+
+    def test_latency_flush_error_is_raised_by_the_next_call(self):
+        self.fail_batches.add(5)
+        inserter = BulkInserter(self.db, "t", GPUdb.point_schema_str, max_latency=0.05)
+        inserter.add(point(5))
+        end_time = time.time() + 2
+        while (inserter.error is None) and (time.time() < end_time):
+            time.sleep(0.01)
+        self.assertRaises(ValueError, inserter.add, point(6))
+        self.assertEqual(len(inserter.take_records()), 1)
+        inserter.close()
+
+    def test_closed_inserter_rejects_records(self):
+        with BulkInserter(self.db, "t", GPUdb.point_schema_str) as inserter:
+            pass
+        self.assertRaises(AssertionError, inserter.add, point(0))
+        self.assertEqual(self.batch_sizes(), [])
+        self.assertRaises(AssertionError, BulkInserter, self.db, "t", GPUdb.point_schema_str, batch_size=0)
+
+# end class BulkInserterTest
+
+
+class InsertPipelineTest(IngestTestCase):
+
+    def test_inserts_every_batch(self):
+        with InsertPipeline(self.db, "t", GPUdb.point_schema_str, workers=3) as pipeline:
+            futures = [ pipeline.submit([ point(i * 10 + j) for j in range(10) ]) for i in range(20) ]
+            self.assertTrue(pipeline.wait(5))
+        self.assertEqual(sorted(self.inserted_xs()), range(200))
+        self.assertEqual([ f.result()["count_inserted"] for f in futures ], [10] * 20)
+        self.assertEqual((pipeline.count_inserted, pipeline.num_batches, pipeline.num_errors), (200, 20, 0))
+
+    def test_ordered_futures_complete_in_submission_order(self):
+        self.batch_delays[0] = 0.3
+        done = []
+        with InsertPipeline(self.db, "t", GPUdb.point_schema_str, workers=2, ordered=True) as pipeline:
+            for i in range(4):
+                pipeline.submit([point(i)]).add_done_callback(lambda f: done.append(f.seq))
+        self.assertEqual(done, [0, 1, 2, 3])
+        self.assertNotEqual(self.inserted_xs()[0], 0) # sent out of order all the same
+
+    def test_unordered_futures_complete_as_inserted(self):
+        self.batch_delays[0] = 0.3
+        done = []
+        with InsertPipeline(self.db, "t", GPUdb.point_schema_str, workers=2) as pipeline:
+            for i in range(4):
+                pipeline.submit([point(i)]).add_done_callback(lambda f: done.append(f.seq))
+        self.assertEqual(done[-1], 0)
+
+    def test_submit_blocks_when_max_in_flight_batches_wait(self):
+        self.batch_delays[0] = 0.3
+        with InsertPipeline(self.db, "t", GPUdb.point_schema_str, workers=1, max_in_flight=1) as pipeline:
+            pipeline.submit([point(0)])
+            time.sleep(0.05) # the worker takes batch 0
+            pipeline.submit([point(1)])
+            start = time.time()
+            pipeline.submit([point(2)])
+            self.assertTrue(time.time() - start > 0.15)
+
+    def test_failed_batch(self):
+        self.fail_batches.add(1)
+        with InsertPipeline(self.db, "t", GPUdb.point_schema_str, workers=2) as pipeline:
+            futures = [ pipeline.submit([point(i)]) for i in range(3) ]
+        self.assertRaises(ValueError, futures[1].result)
+        self.assertTrue(futures[1].exception() is not None)
+        self.assertEqual(futures[0].exception(), None)
+        self.assertEqual((pipeline.count_inserted, pipeline.num_errors), (2, 1))
+        self.assertRaises(AssertionError, pipeline.submit, [point(3)])
+
+    def test_result_timeout(self):
+        self.batch_delays[0] = 0.3
+        with InsertPipeline(self.db, "t", GPUdb.point_schema_str, workers=1) as pipeline:
+            future = pipeline.submit([point(0)])
+            self.assertRaises(RuntimeError, future.result, 0.01)
+            self.assertFalse(pipeline.wait(0.01))
+        self.assertTrue(future.done())
+
+# end class InsertPipelineTest
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,92 @@
+# ---------------------------------------------------------------------------
+# test_insert_rows.py - insert_rows() encoding and batching.
+# ---------------------------------------------------------------------------
+
+import unittest
+
+from gpudb.gpudb import GPUdb
+from avro import schema
+
+from gpudb_server import GPUdbTestServer, TableStore
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+SCHEMA = schema.parse(GPUdb.point_schema_str)
+
+ROWS = [ { "x": float(i), "y": i * 0.25, "OBJECT_ID": u"row %d \u00e9" % i } for i in range(50) ]
+
+
+class InsertRowsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.store = TableStore(GPUdb.point_schema_str)
+        self.store.tables["t"] = []
+        self.server = GPUdbTestServer(self.store.handlers())
+        self.addCleanup(self.server.close)
+        self.db = GPUdb(host=self.server.address)
+        self.addCleanup(self.db.connection_pool.clear)
+        self.expected = [ self.db.write_datum(SCHEMA, row) for row in ROWS ]
+
+    def insert_requests(self):
+        return [ request for request in self.server.requests if request[0] == "/insert/records" ]
+
+    def test_dicts(self):
+        response = self.db.insert_rows("t", iter(ROWS))
+        self.assertEqual(response["count_inserted"], len(ROWS))
+        self.assertEqual(self.store.tables["t"], self.expected)
+
+    def test_tuples_in_field_order(self):
+        self.db.insert_rows("t", [ (row["x"], row["y"], row["OBJECT_ID"]) for row in ROWS ])
+        self.assertEqual(self.store.tables["t"], self.expected)
+
+    def test_columns_of_lists(self):
+        columns = dict([ (name, [ row[name] for row in ROWS ]) for name in ("x", "y", "OBJECT_ID") ])
+        self.db.insert_rows("t", columns)
+        self.assertEqual(self.store.tables["t"], self.expected)
+
+    @unittest.skipIf(numpy is None, "needs numpy")
+    def test_columns_of_arrays_in_blocks(self):
+        columns = { "x": numpy.array([ row["x"] for row in ROWS ]),
+                    "y": numpy.array([ row["y"] for row in ROWS ]),
+                    "OBJECT_ID": [ row["OBJECT_ID"] for row in ROWS ] }
+        self.assertEqual(list(self.db.encode_columns(SCHEMA, columns, rows_per_block=7)), self.expected)
+
+    def test_columns_of_unequal_length_raise(self):
+        columns = { "x": [1.0, 2.0], "y": [1.0, 2.0], "OBJECT_ID": [u"a"] }
+        for db in (self.db, GPUdb(encoding="JSON")):
+            self.assertRaises(ValueError, list, db.encode_columns(SCHEMA, columns))
+        self.assertRaises(ValueError, self.db.insert_rows, "t", columns)
+        self.assertEqual(len(self.insert_requests()), 0)
+
+    def test_no_rows_sends_nothing(self):
+        response = self.db.insert_rows("t", [])
+        self.assertEqual(response["count_inserted"], 0)
+        self.assertEqual(len(self.insert_requests()), 0)
+
+    def test_requests_stay_within_max_request_size(self):
+        # Room for exactly three rows of the largest size per request
+        envelope_size = self.db.insert_records_envelope_size("t", {})
+        row_size = max([ len(encoded) for encoded in self.expected ]) + 5
+        max_request_size = envelope_size + 3 * row_size
+
+        self.db.insert_rows("t", ROWS, max_request_size)
+        requests = self.insert_requests()
+        self.assertEqual(self.store.tables["t"], self.expected)
+        self.assertEqual(len(requests), (len(ROWS) + 2) // 3)
+        for path,headers,request,body_size in requests:
+            self.assertTrue(body_size <= max_request_size)
+            self.assertEqual(len(request["list"]), 3 if request is not requests[-1][2] else len(ROWS) % 3)
+
+    def test_row_larger_than_max_request_size_is_sent_alone(self):
+        self.db.insert_rows("t", ROWS[:3], max_request_size=1)
+        self.assertEqual([ len(request[2]["list"]) for request in self.insert_requests() ], [1, 1, 1])
+
+# end class InsertRowsTest
+
+
+if __name__ == "__main__":
+    unittest.main()
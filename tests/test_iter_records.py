@@ -0,0 +1,100 @@
+# ---------------------------------------------------------------------------
+# test_iter_records.py - iter_records() paging against a local server.
+# ---------------------------------------------------------------------------
+
+import unittest
+
+from gpudb.gpudb import GPUdb
+
+from gpudb_server import GPUdbTestServer, TableStore, encode
+
+from avro import io, schema
+
+
+SCHEMA = schema.parse(GPUdb.point_schema_str)
+
+
+def make_rows(count):
+    return [ { "x": float(i), "y": 1.0, "OBJECT_ID": u"%d" % i } for i in range(count) ]
+
+
+class IterRecordsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.store = TableStore(GPUdb.point_schema_str)
+        handlers = self.store.handlers()
+        handlers["/get/records"] = self.get_records
+        self.max_records = None # most records the server returns per call
+        self.fail = False
+        self.server = GPUdbTestServer(handlers)
+        self.addCleanup(self.server.close)
+        self.db = GPUdb(host=self.server.address)
+        self.addCleanup(self.db.connection_pool.clear)
+
+    def get_records(self, request):
+        if self.fail:
+            raise ValueError("get_records failed")
+        if self.max_records is not None:
+            request = dict(request, limit=min(request["limit"], self.max_records))
+        return self.store.get_records(request)
+
+    def fill(self, count):
+        rows = make_rows(count)
+        self.store.tables["t"] = [ encode(SCHEMA, row) for row in rows ]
+        return rows
+
+    def iterate(self, **kwargs):
+        return [ dict(record) for record in self.db.iter_records("t", page_size=10, **kwargs) ]
+
+    def test_pages_up_to_the_table_size(self):
+        for count,calls in ((30, 3), (25, 3), (10, 1), (1, 1)):
+            for prefetch in (0, 2):
+                rows = self.fill(count)
+                del self.server.requests[:]
+                self.assertEqual(self.iterate(prefetch=prefetch), rows)
+                self.assertEqual(self.server.paths(), ["/show/table"] + ["/get/records"] * calls)
+
+    def test_empty_table_fetches_no_page(self):
+        self.fill(0)
+        self.assertEqual(self.iterate(), [])
+        self.assertEqual(self.server.paths(), ["/show/table"])
+
+    def test_pages_cut_short_by_the_server_do_not_end_the_paging(self):
+        rows = self.fill(30)
+        self.max_records = 7
+        for prefetch in (0, 2):
+            self.assertEqual(self.iterate(prefetch=prefetch), rows)
+        offsets = [ request[2]["offset"] for request in self.server.requests
+                    if request[0] == "/get/records" ]
+        self.assertEqual(offsets, [0, 7, 14, 21, 28] * 2)
+
+    def test_records_deleted_while_paging(self):
+        rows = self.fill(30)
+        records = self.db.iter_records("t", page_size=10, prefetch=0)
+        first = [ next(records) for i in range(10) ]
+        del self.store.tables["t"][20:] # leaves an empty third page
+
+        self.assertEqual([ dict(record) for record in first + list(records) ], rows[:20])
+        self.assertEqual(self.server.paths(), ["/show/table"] + ["/get/records"] * 3)
+
+    def test_columns_and_record_types(self):
+        rows = self.fill(12)
+        self.assertEqual(self.iterate(columns=["OBJECT_ID", "x"]),
+                         [ { "OBJECT_ID": row["OBJECT_ID"], "x": row["x"] } for row in rows ])
+        self.assertEqual([ record["x"] for record in self.db.iter_records("t", record_type="slots") ],
+                         [ row["x"] for row in rows ])
+        lazy = list(self.db.iter_records("t", record_type="lazy"))
+        self.assertTrue(isinstance(lazy[0], io.LazyRecord))
+        self.assertEqual([ record["OBJECT_ID"] for record in lazy ], [ row["OBJECT_ID"] for row in rows ])
+
+    def test_error_page_raises(self):
+        self.fill(5)
+        self.fail = True
+        for prefetch in (0, 2):
+            self.assertRaises(ValueError, list, self.db.iter_records("t", prefetch=prefetch))
+
+# end class IterRecordsTest
+
+
+if __name__ == "__main__":
+    unittest.main()
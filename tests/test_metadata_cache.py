@@ -0,0 +1,166 @@
+# ---------------------------------------------------------------------------
+# test_metadata_cache.py - Metadata caching and invalidation.
+# ---------------------------------------------------------------------------
+
+import time
+import unittest
+
+from gpudb.gpudb import GPUdb
+from gpudb.gpudb_cache import GPUdbMetadataCache
+
+from gpudb_server import GPUdbTestServer, TableStore
+
+
+class MetadataCacheTest(unittest.TestCase):
+
+    def response(self, table_name, is_collection=False):
+        return { "table_name": table_name, "table_names": [table_name],
+                 "is_collection": [is_collection], "type_schemas": [GPUdb.point_schema_str] }
+
+    def put(self, cache, endpoint, table_name, **kwargs):
+        key = (endpoint, table_name)
+        cache.put(key, { "table_name": table_name }, self.response(table_name, **kwargs))
+        return key
+
+    def test_entries_expire_after_the_ttl(self):
+        cache = GPUdbMetadataCache(0.05)
+        key = self.put(cache, "/show/table", "t")
+        self.assertEqual(cache.get(key)["table_name"], "t")
+        time.sleep(0.1)
+        self.assertEqual(cache.get(key), None)
+        self.assertEqual(cache.get_stats(), { "hits": 1, "misses": 1, "invalidations": 0,
+                                              "hit_rate": 0.5, "entries": 0 })
+
+    def test_copies_are_isolated_from_the_cache(self):
+        cache = GPUdbMetadataCache(60)
+        key = self.put(cache, "/show/table", "t")
+        response = cache.get(key)
+        response["table_names"].append("u")
+        response["table_name"] = "u"
+        self.assertEqual(cache.get(key)["table_names"], ["t"])
+        self.assertEqual(cache.get(key)["table_name"], "t")
+        self.assertTrue(cache.get(key)["type_schema_objects"][0] is response["type_schema_objects"][0])
+
+    def test_get_sizes_is_not_cached(self):
+        cache = GPUdbMetadataCache(60)
+        self.assertTrue(cache.is_cacheable("/show/table", { "options": {} }))
+        self.assertFalse(cache.is_cacheable("/show/table", { "options": { "get_sizes": "true" } }))
+        self.assertFalse(cache.is_cacheable("/get/records", { "options": {} }))
+
+    def test_invalidate_tables(self):
+        cache = GPUdbMetadataCache(60)
+        t = self.put(cache, "/show/table", "t")
+        u = self.put(cache, "/has/table", "u")
+        every = self.put(cache, "/show/table", "")
+        collection = self.put(cache, "/show/table", "c", is_collection=True)
+        types = self.put(cache, "/show/types", "")
+
+        cache.invalidate_tables(["t"])
+        self.assertEqual([ key in cache.entries for key in (t, u, every, collection, types) ],
+                         [False, True, False, False, True])
+        cache.invalidate_tables([""])
+        self.assertEqual(cache.entries.keys(), [types])
+        cache.invalidate_types()
+        self.assertEqual(cache.get_stats()["invalidations"], 5)
+
+# end class MetadataCacheTest
+
+
+class ClientMetadataCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.store = TableStore(GPUdb.point_schema_str)
+        self.store.tables["t"] = []
+        handlers = self.store.handlers()
+        handlers["/clear/table"] = self.clear_table
+        self.server = GPUdbTestServer(handlers)
+        self.addCleanup(self.server.close)
+
+    def clear_table(self, request):
+        del self.store.tables[request["table_name"]]
+        return { "table_name": request["table_name"] }
+
+    def make_client(self, **kwargs):
+        db = GPUdb(host=self.server.address, **kwargs)
+        self.addCleanup(db.connection_pool.clear)
+        return db
+
+    def test_responses_are_cached_until_the_ttl(self):
+        db = self.make_client(metadata_cache_ttl=0.2)
+        for i in range(3):
+            self.assertEqual(db.show_table("t")["type_schemas"], [GPUdb.point_schema_str])
+        self.assertEqual(self.server.paths(), ["/show/table"])
+
+        time.sleep(0.3)
+        db.show_table("t")
+        self.assertEqual(self.server.paths(), ["/show/table"] * 2)
+        self.assertEqual(db.get_metadata_cache_stats()["hits"], 2)
+
+    def test_sizes_are_always_fetched(self):
+        db = self.make_client(metadata_cache_ttl=60)
+        for i in range(2):
+            self.assertEqual(db.show_table("t", { "get_sizes": "true" })["total_size"], 0)
+        self.assertEqual(self.server.paths(), ["/show/table"] * 2)
+
+    def test_clear_table_drops_its_metadata(self):
+        db = self.make_client(metadata_cache_ttl=60)
+        self.assertTrue(db.has_table("t")["table_exists"])
+        db.clear_table("t")
+        self.assertFalse(db.has_table("t")["table_exists"])
+        self.assertEqual(self.server.paths(), ["/has/table", "/clear/table", "/has/table"])
+
+    def test_no_cache_by_default(self):
+        db = self.make_client()
+        db.has_table("t")
+        db.has_table("t")
+        self.assertEqual(self.server.paths(), ["/has/table"] * 2)
+        self.assertEqual(db.get_metadata_cache_stats(), None)
+
+# end class ClientMetadataCacheTest
+
+
+class MetadataInvalidationTest(unittest.TestCase):
+
+    def setUp(self):
+        self.store = TableStore(GPUdb.point_schema_str)
+        self.store.tables["old"] = []
+        self.server = GPUdbTestServer(self.store.handlers())
+        self.addCleanup(self.server.close)
+        self.db = GPUdb(host=self.server.address, metadata_cache_ttl=60)
+        self.addCleanup(self.db.connection_pool.clear)
+
+    def table_exists(self, name):
+        return self.db.has_table(name, {})["table_exists"]
+
+    def rename(self, old, new):
+        """What post_then_get does after an alter_table rename_table response."""
+        datum = { "table_name": old, "action": "rename_table", "value": new, "options": {} }
+        self.store.tables[new] = self.store.tables.pop(old)
+        self.db.update_metadata('/alter/table', datum, None, None)
+
+    def test_rename_drops_the_old_and_the_new_name(self):
+        self.assertTrue(self.table_exists("old"))
+        self.assertFalse(self.table_exists("new"))
+        self.db.get_table_type_schema("old")
+
+        self.rename("old", "new")
+        self.assertFalse(self.table_exists("old"))
+        self.assertTrue(self.table_exists("new"))
+        self.assertTrue("old" not in self.db.table_type_schemas)
+        self.assertEqual(self.server.paths().count("/has/table"), 4)
+
+    def test_other_alter_table_actions_drop_only_the_table(self):
+        self.assertFalse(self.table_exists("new"))
+        self.assertTrue(self.table_exists("old"))
+        self.db.update_metadata('/alter/table', { "table_name": "old", "column_name": "x",
+                                                  "action": "create_index", "options": {} },
+                                None, None)
+        self.table_exists("new")
+        self.table_exists("old")
+        self.assertEqual(self.server.paths().count("/has/table"), 3)
+
+# end class MetadataInvalidationTest
+
+
+if __name__ == "__main__":
+    unittest.main()
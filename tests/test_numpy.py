@@ -0,0 +1,160 @@
+# ---------------------------------------------------------------------------
+# test_numpy.py - Columnar encoding and decoding with NumPy.
+#
+# Skipped unless numpy is installed.
+# ---------------------------------------------------------------------------
+
+import unittest
+
+from gpudb.gpudb import GPUdb
+from avro import io, schema
+
+try:
+    import numpy
+    from gpudb import gpudb_numpy
+except ImportError:
+    numpy = None
+
+
+ALL_TYPES_SCHEMA = schema.parse("""{"type":"record","name":"all_types","fields":[
+    {"name":"d1","type":"double"},{"name":"f","type":"float"},{"name":"b","type":"boolean"},
+    {"name":"i","type":"int"},{"name":"s","type":"string"},{"name":"d2","type":"double"},
+    {"name":"n","type":"null"},{"name":"l","type":"long"},{"name":"raw","type":"bytes"}]}""")
+
+NULL_SCHEMA = schema.parse("""{"type":"record","name":"nulls","fields":[
+    {"name":"a","type":"null"},{"name":"b","type":"null"}]}""")
+
+
+def make_rows(count):
+    return [ { "d1": i * 1.5 - 7.0, "f": i * 0.5, "b": (i % 3 == 0), "i": (-1) ** i * i * 1000,
+               "s": u"\u00e9" * (i % 4) + "x" * (i * 7), "d2": -i / 3.0, "n": None,
+               "l": (-1) ** i * (2 ** (i % 63)), "raw": "\x00\xff" * i }
+             for i in range(count) ]
+
+def to_columns(rows, fields):
+    return dict([ (field.name, [ row[field.name] for row in rows ]) for field in fields ])
+
+
+@unittest.skipIf(numpy is None, "needs numpy")
+class WriteColumnsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.db = GPUdb()
+
+    def test_byte_identical_to_write_datum(self):
+        rows = make_rows(40)
+        expected = [ self.db.write_datum(ALL_TYPES_SCHEMA, row) for row in rows ]
+
+        columns = to_columns(rows, ALL_TYPES_SCHEMA.fields)
+        self.assertEqual(gpudb_numpy.write_columns(ALL_TYPES_SCHEMA, columns), expected)
+
+        arrays = dict([ (name, numpy.array(column)) for name,column in columns.items()
+                        if name not in ("s", "raw", "n") ])
+        arrays.update(s=columns["s"], raw=columns["raw"], n=columns["n"])
+        self.assertEqual(gpudb_numpy.write_columns(ALL_TYPES_SCHEMA, arrays, validate=True), expected)
+
+    def test_only_null_fields(self):
+        columns = { "a": [None] * 5, "b": [None] * 5 }
+        self.assertEqual(gpudb_numpy.write_columns(NULL_SCHEMA, columns),
+                         [ self.db.write_datum(NULL_SCHEMA, { "a": None, "b": None }) ] * 5)
+
+    def test_no_rows(self):
+        columns = to_columns([], ALL_TYPES_SCHEMA.fields)
+        self.assertEqual(gpudb_numpy.write_columns(ALL_TYPES_SCHEMA, columns), [])
+
+    def test_every_column_length_is_checked(self):
+        for name in ("f", "b", "d2", "n", "l"): # including within a run of fixed width fields
+            columns = to_columns(make_rows(5), ALL_TYPES_SCHEMA.fields)
+            columns[name] = columns[name][:4]
+            self.assertRaises(ValueError, gpudb_numpy.write_columns, ALL_TYPES_SCHEMA, columns)
+
+    def test_validate_rejects_bad_columns(self):
+        for name,column in (("i", [2 ** 40] * 5), ("d1", ["a"] * 5), ("s", [1] * 5)):
+            columns = to_columns(make_rows(5), ALL_TYPES_SCHEMA.fields)
+            columns[name] = column
+            self.assertRaises(io.AvroTypeException, gpudb_numpy.write_columns,
+                              ALL_TYPES_SCHEMA, columns, True)
+
+    def test_can_write_columns(self):
+        self.assertTrue(gpudb_numpy.can_write_columns(ALL_TYPES_SCHEMA))
+        self.assertFalse(gpudb_numpy.can_write_columns(schema.parse(
+            """{"type":"record","name":"r","fields":[{"name":"u","type":["double","null"]}]}""")))
+
+# end class WriteColumnsTest
+
+
+COLUMNS_SCHEMA_STR = """{"type":"record","name":"generic_response","fields":[
+    {"name":"column_1","type":{"type":"array","items":"double"}},
+    {"name":"column_2","type":{"type":"array","items":"long"}},
+    {"name":"column_3","type":{"type":"array","items":"int"}},
+    {"name":"column_4","type":{"type":"array","items":"string"}},
+    {"name":"column_5","type":{"type":"array","items":"boolean"}},
+    {"name":"column_6","type":{"type":"array","items":["double","null"]}},
+    {"name":"column_7","type":{"type":"array","items":["null","string"]}},
+    {"name":"column_headers","type":{"type":"array","items":"string"}}]}"""
+
+def make_response(count):
+    response = { "column_1": [ i * 0.5 for i in range(count) ],
+                 "column_2": [ (-1) ** i * 7 ** (i % 22) for i in range(count) ],
+                 "column_3": [ i - 500 for i in range(count) ],
+                 "column_4": [ u"g%d" % i for i in range(count) ],
+                 "column_5": [ i % 2 == 0 for i in range(count) ],
+                 "column_6": [ None if i % 3 == 0 else i * 0.25 for i in range(count) ],
+                 "column_7": [ None if i % 4 == 0 else u"s%d" % i for i in range(count) ],
+                 "column_headers": [ u"x", u"id", u"offset", u"name", u"flag", u"value", u"label" ] }
+    be = io.BinaryBufferEncoder()
+    io.compile_writer(schema.parse(COLUMNS_SCHEMA_STR))(response, be)
+    return response,be.getvalue()
+
+
+@unittest.skipIf(numpy is None, "needs numpy")
+class ReadColumnsTest(unittest.TestCase):
+
+    def test_same_values_as_the_compiled_reader(self):
+        response,encoded = make_response(300)
+        columns = gpudb_numpy.read_columns(schema.parse(COLUMNS_SCHEMA_STR), encoded)
+
+        self.assertEqual(columns["column_1"].dtype, numpy.float64)
+        self.assertEqual(columns["column_2"].dtype, numpy.int64)
+        self.assertEqual(columns["column_3"].dtype, numpy.int32)
+        for name,values in response.items():
+            if name in ("column_6", "column_7"):
+                continue
+            self.assertEqual(list(columns[name]), values)
+
+    def test_nullable_columns_are_masked(self):
+        response,encoded = make_response(30)
+        columns = gpudb_numpy.read_columns(schema.parse(COLUMNS_SCHEMA_STR), encoded)
+
+        for name,fill in (("column_6", 0.0), ("column_7", u"")):
+            column = columns[name]
+            self.assertTrue(isinstance(column, numpy.ma.MaskedArray))
+            self.assertEqual(list(column.mask), [ value is None for value in response[name] ])
+            self.assertEqual(column.filled(fill).tolist(),
+                             [ fill if value is None else value for value in response[name] ])
+
+    def test_parse_dynamic_response(self):
+        response,encoded = make_response(20)
+        retobj = { "status_info": { "status": "OK" }, "response_schema_str": COLUMNS_SCHEMA_STR,
+                   "binary_encoded_response": encoded, "json_encoded_response": "" }
+        db = GPUdb()
+
+        columns = db.parse_dynamic_response(dict(retobj), as_numpy=True)["response"]
+        self.assertEqual(list(columns["x"]), response["column_1"])
+        self.assertTrue(isinstance(columns["value"], numpy.ma.MaskedArray))
+
+        records = db.parse_dynamic_response(dict(retobj), as_numpy=True, structured=True)["response"]
+        self.assertEqual(list(records["value"].mask), [ value is None for value in response["column_6"] ])
+        self.assertEqual(list(records["id"]), response["column_2"])
+
+    def test_empty_columns(self):
+        response,encoded = make_response(0)
+        columns = gpudb_numpy.read_columns(schema.parse(COLUMNS_SCHEMA_STR), encoded)
+        self.assertEqual(len(columns["column_1"]), 0)
+        self.assertEqual(len(columns["column_6"]), 0)
+
+# end class ReadColumnsTest
+
+
+if __name__ == "__main__":
+    unittest.main()
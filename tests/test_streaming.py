@@ -0,0 +1,124 @@
+# ---------------------------------------------------------------------------
+# test_streaming.py - insert_records_stream() against a local server.
+# ---------------------------------------------------------------------------
+
+import unittest
+
+from gpudb.gpudb import GPUdb, GPUdbRetryPolicy, GPUdbConnectionError
+
+from gpudb_server import GPUdbTestServer, TableStore, free_port
+
+
+def make_records(count, start=0):
+    return [ schemas_client.encode_datum(GPUdb.point_schema_str,
+                                         {"x": float(i), "y": 0.5, "OBJECT_ID": "record %d" % i})
+             for i in range(start, start + count) ]
+
+schemas_client = GPUdb()
+
+
+class InsertRecordsStreamTest(unittest.TestCase):
+
+    def setUp(self):
+        self.store = TableStore(GPUdb.point_schema_str)
+        self.server = GPUdbTestServer(self.store.handlers())
+        self.addCleanup(self.server.close)
+
+    def make_client(self, hosts=None, **kwargs):
+        db = GPUdb(host=hosts or self.server.address, **kwargs)
+        self.addCleanup(db.connection_pool.clear)
+        return db
+
+    def last_headers(self):
+        return self.server.requests[-1][1]
+
+    def test_chunked_body_of_several_blocks(self):
+        db = self.make_client()
+        records = make_records(1000)
+
+        response = db.insert_records_stream("t", iter(records), chunk_size=1024)
+        self.assertEqual(response["count_inserted"], 1000)
+        self.assertEqual(self.store.tables["t"], records)
+        self.assertEqual(self.last_headers().get("transfer-encoding"), "chunked")
+
+    def test_content_length_when_not_chunked(self):
+        db = self.make_client()
+        records = make_records(100)
+
+        db.insert_records_stream("t", records, chunk_size=512, chunked=False)
+        self.assertEqual(self.store.tables["t"], records)
+        self.assertTrue("transfer-encoding" not in self.last_headers())
+        self.assertEqual(int(self.last_headers()["content-length"]), self.server.requests[-1][3])
+
+    def test_pieces_compressed_as_they_are_sent(self):
+        for name in ("gzip", "deflate"):
+            db = self.make_client(compression=name, compression_threshold=1)
+            records = make_records(500)
+            self.store.tables.clear()
+
+            db.insert_records_stream("t", records, chunk_size=1024)
+            self.assertEqual(self.store.tables["t"], records)
+            self.assertEqual(self.last_headers()["content-encoding"], name)
+            stats = db.get_compression_stats()
+            self.assertEqual(stats["requests_compressed"], 1)
+            self.assertTrue(stats["request_ratio"] > 1.0)
+
+    def test_small_body_below_the_threshold_is_not_compressed(self):
+        db = self.make_client(compression=[ (1024 * 1024, "gzip") ])
+        db.insert_records_stream("t", make_records(10))
+        self.assertTrue("content-encoding" not in self.last_headers())
+
+    def test_insert_records_streams_from_the_threshold(self):
+        db = self.make_client(stream_threshold=2048)
+
+        db.insert_records("t", make_records(10), None, {})
+        self.assertTrue("transfer-encoding" not in self.last_headers())
+
+        records = make_records(1000)
+        response = db.insert_records("t", records, None, {})
+        self.assertEqual(response["count_inserted"], 1000)
+        self.assertEqual(self.last_headers().get("transfer-encoding"), "chunked")
+        self.assertEqual(self.store.tables["t"][10:], records)
+
+    def test_no_streaming_when_disabled_or_json(self):
+        records = make_records(1000)
+        db = self.make_client(stream_threshold=None)
+        db.insert_records("t", records, None, {})
+        self.assertTrue("transfer-encoding" not in self.last_headers())
+
+        self.assertFalse(GPUdb(encoding="JSON", stream_threshold=1).should_stream_records(records, None))
+        self.assertFalse(GPUdb(stream_threshold=1).should_stream_records([ "{}" ], "json"))
+
+    def test_list_is_sent_again_to_the_next_host(self):
+        policy = GPUdbRetryPolicy(max_attempts=2, backoff=0.0)
+        db = self.make_client(["127.0.0.1:%d" % free_port(), self.server.address],
+                              retry_policy=policy, write_failover=True)
+        records = make_records(100)
+
+        self.assertEqual(db.insert_records_stream("t", records)["count_inserted"], 100)
+        self.assertEqual(self.store.tables["t"], records)
+
+    def test_writes_stay_on_the_primary(self):
+        policy = GPUdbRetryPolicy(max_attempts=2, backoff=0.0)
+        db = self.make_client(["127.0.0.1:%d" % free_port(), self.server.address],
+                              retry_policy=policy)
+
+        with self.assertRaises(GPUdbConnectionError) as raised:
+            db.insert_records_stream("t", make_records(100))
+        self.assertEqual(raised.exception.attempts, 2)
+        self.assertEqual(self.server.paths(), [])
+
+    def test_generator_is_not_sent_again(self):
+        policy = GPUdbRetryPolicy(max_attempts=2, backoff=0.0)
+        db = self.make_client(["127.0.0.1:%d" % free_port(), self.server.address],
+                              retry_policy=policy, write_failover=True)
+
+        self.assertRaises(GPUdbConnectionError, db.insert_records_stream, "t",
+                          iter(make_records(100)))
+        self.assertEqual(self.server.paths(), [])
+
+# end class InsertRecordsStreamTest
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,271 @@
+# ---------------------------------------------------------------------------
+# test_transport.py - Retries, timeouts, hedging and compression of the
+# synchronous client against a local server.
+# ---------------------------------------------------------------------------
+
+import time
+import unittest
+import zlib
+
+from gpudb.gpudb import GPUdb, GPUdbRetryPolicy, GPUdbHedgingPolicy
+from gpudb.gpudb import GPUdbConnectionError, GPUdbResponseError, GPUdbTimeoutError
+from gpudb.gpudb_transport import GPUdbException, compression_codecs
+
+from gpudb_server import GPUdbTestServer, TableStore, free_port
+
+
+class RetryPolicyTest(unittest.TestCase):
+
+    def test_can_retry(self):
+        policy = GPUdbRetryPolicy()
+        not_sent = GPUdbConnectionError("refused")
+        no_response = GPUdbResponseError("reset")
+        self.assertTrue(policy.can_retry(not_sent, "/insert/records"))
+        self.assertTrue(policy.can_retry(no_response, "/get/records"))
+        self.assertTrue(policy.can_retry(no_response, "/filter/bybox"))
+        self.assertFalse(policy.can_retry(no_response, "/insert/records"))
+        self.assertFalse(policy.can_retry(GPUdbTimeoutError("slow"), "/clear/table"))
+
+        policy = GPUdbRetryPolicy(idempotent_endpoints=["/insert/"])
+        self.assertTrue(policy.can_retry(no_response, "/insert/records"))
+        self.assertFalse(policy.can_retry(no_response, "/get/records"))
+
+    def test_get_delay(self):
+        policy = GPUdbRetryPolicy(backoff=0.1, max_backoff=0.3, jitter=0.0)
+        self.assertEqual([ policy.get_delay(attempt) for attempt in (1, 2, 3, 4) ], [0.1, 0.2, 0.3, 0.3])
+
+        policy = GPUdbRetryPolicy(backoff=1.0, jitter=0.5)
+        for i in range(100):
+            self.assertTrue(0.5 <= policy.get_delay(1) <= 1.0)
+
+    def test_bad_arguments(self):
+        self.assertRaises(AssertionError, GPUdbRetryPolicy, max_attempts=0)
+        self.assertRaises(AssertionError, GPUdbRetryPolicy, jitter=1.5)
+
+# end class RetryPolicyTest
+
+
+class RetryAndTimeoutTest(unittest.TestCase):
+
+    def setUp(self):
+        self.store = TableStore(GPUdb.point_schema_str)
+        self.store.tables["t"] = []
+        self.server = GPUdbTestServer(self.store.handlers())
+        self.addCleanup(self.server.close)
+
+    def make_client(self, host=None, **kwargs):
+        db = GPUdb(host=host or self.server.address, **kwargs)
+        self.addCleanup(db.connection_pool.clear)
+        return db
+
+    def test_read_timeout(self):
+        db = self.make_client(read_timeout=0.1, retry_policy=GPUdbRetryPolicy(max_attempts=1))
+        self.server.delay["/has/table"] = 0.5
+
+        start = time.time()
+        with self.assertRaises(GPUdbTimeoutError) as raised:
+            db.has_table("t")
+        self.assertTrue(time.time() - start < 0.4)
+        self.assertEqual(raised.exception.endpoint, "/has/table")
+
+    def test_timed_out_read_is_retried(self):
+        db = self.make_client(read_timeout=0.1, retry_policy=GPUdbRetryPolicy(max_attempts=3, backoff=0.0))
+        self.server.delay["/has/table"] = 0.3
+
+        with self.assertRaises(GPUdbTimeoutError) as raised:
+            db.has_table("t")
+        self.assertEqual(raised.exception.attempts, 3)
+        self.assertEqual(self.server.paths(), ["/has/table"] * 3)
+
+    def test_request_options_override_and_restore(self):
+        db = self.make_client()
+        self.server.delay["/has/table"] = 0.3
+
+        with db.request_options(read_timeout=0.05, retry_policy=GPUdbRetryPolicy(max_attempts=1)):
+            self.assertRaises(GPUdbTimeoutError, db.has_table, "t")
+        self.assertTrue(db.has_table("t")["table_exists"]) # back to no timeout
+        self.assertRaises(AssertionError, db.request_options(bad=1).__enter__)
+
+    def test_insert_is_not_resent_after_a_dropped_connection(self):
+        db = self.make_client()
+        db.has_table("t") # leaves a keep-alive connection
+        self.server.drop.add("/insert/records")
+
+        self.assertRaises(GPUdbResponseError, db.insert_records, "t", [], None, {})
+        self.assertEqual(self.server.paths().count("/insert/records"), 1)
+
+    def test_read_is_resent_after_a_dropped_connection(self):
+        db = self.make_client(retry_policy=GPUdbRetryPolicy(max_attempts=2, backoff=0.0))
+        self.server.drop.add("/has/table")
+
+        with self.assertRaises(GPUdbResponseError) as raised:
+            db.has_table("t")
+        self.assertEqual(raised.exception.attempts, 2)
+        self.assertEqual(self.server.paths(), ["/has/table"] * 2)
+
+    def test_unreachable_host_is_a_connection_error(self):
+        db = self.make_client("127.0.0.1:%d" % free_port(),
+                              retry_policy=GPUdbRetryPolicy(max_attempts=2, backoff=0.0))
+        with self.assertRaises(GPUdbConnectionError) as raised:
+            db.insert_records("t", [], None, {}) # never sent, so safe to retry
+        self.assertEqual(raised.exception.attempts, 2)
+
+# end class RetryAndTimeoutTest
+
+
+class HedgingTest(unittest.TestCase):
+
+    def test_percentile_delay(self):
+        hedging = GPUdbHedgingPolicy(percentile=50.0, min_samples=3, min_delay=0.002)
+        self.assertEqual(hedging.get_delay("/get/records"), None)
+        for seconds in (0.001, 0.005, 0.003):
+            hedging.record("/get/records", seconds)
+        self.assertEqual(hedging.get_delay("/get/records"), 0.003)
+        self.assertEqual(hedging.get_delay("/has/table"), None)
+
+        hedging.record("/has/table", 0.0)
+        hedging.record("/has/table", 0.0)
+        hedging.record("/has/table", 0.001)
+        self.assertEqual(hedging.get_delay("/has/table"), 0.002) # min_delay
+
+    def test_window_and_stats(self):
+        hedging = GPUdbHedgingPolicy(percentile=100.0, window=2, min_samples=1)
+        for seconds in (9.0, 1.0, 2.0):
+            hedging.record("/show/table", seconds)
+        self.assertEqual(hedging.get_delay("/show/table"), 2.0) # 9.0 fell out of the window
+
+        hedging.count_hedge(True)
+        hedging.count_hedge(False)
+        stats = hedging.get_stats()
+        self.assertEqual((stats["requests"], stats["hedges_fired"], stats["hedges_won"]), (1, 2, 1))
+        self.assertEqual((stats["fire_rate"], stats["win_rate"]), (2.0, 0.5))
+        self.assertEqual(stats["delays"], { "/show/table": 2.0 })
+
+    def test_slow_read_is_hedged_to_another_host(self):
+        store = TableStore(GPUdb.point_schema_str)
+        store.tables["t"] = []
+        fast = GPUdbTestServer(store.handlers())
+        self.addCleanup(fast.close)
+        slow = GPUdbTestServer(store.handlers())
+        self.addCleanup(slow.close)
+        slow.delay["/has/table"] = 0.5
+
+        hedging = GPUdbHedgingPolicy(min_samples=1)
+        hedging.record("/has/table", 0.01)
+        db = GPUdb(host=[slow.address, fast.address], hedging=hedging)
+        self.addCleanup(db.connection_pool.clear)
+
+        start = time.time()
+        self.assertTrue(db.has_table("t")["table_exists"])
+        self.assertTrue(time.time() - start < 0.4)
+        self.assertEqual(hedging.get_stats()["hedges_won"], 1)
+        self.assertEqual(fast.paths(), ["/has/table"])
+        self.assertEqual(db.get_host_stats()["failovers"], 0)
+
+    def test_writes_are_not_hedged(self):
+        store = TableStore(GPUdb.point_schema_str)
+        store.tables["t"] = []
+        server = GPUdbTestServer(store.handlers())
+        self.addCleanup(server.close)
+        server.delay["/insert/records"] = 0.2
+
+        hedging = GPUdbHedgingPolicy(min_samples=1)
+        hedging.record("/insert/records", 0.01)
+        db = GPUdb(host=[server.address, server.address], hedging=hedging)
+        self.addCleanup(db.connection_pool.clear)
+
+        db.insert_records("t", [], None, {})
+        self.assertEqual(server.paths(), ["/insert/records"])
+        self.assertEqual(hedging.get_stats()["hedges_fired"], 0)
+
+# end class HedgingTest
+
+
+class CompressionTest(unittest.TestCase):
+
+    def setUp(self):
+        self.store = TableStore(GPUdb.point_schema_str)
+        self.store.tables["t"] = []
+        self.server = GPUdbTestServer(self.store.handlers())
+        self.addCleanup(self.server.close)
+
+    def make_client(self, **kwargs):
+        db = GPUdb(host=self.server.address, **kwargs)
+        self.addCleanup(db.connection_pool.clear)
+        return db
+
+    def records(self, count):
+        record = GPUdb().encode_datum(GPUdb.point_schema_str, { "x": 1.0, "y": 2.0, "OBJECT_ID": "" })
+        return [record] * count
+
+    def test_codecs_round_trip(self):
+        data = "".join(self.records(500))
+        for name,codec in compression_codecs.items():
+            compressed = codec.compress(data)
+            self.assertTrue(len(compressed) < len(data), name)
+            self.assertEqual(codec.decompress(compressed), data, name)
+
+            if codec.compressobj is not None: # in pieces
+                compressor = codec.compressobj()
+                pieces = [ compressor.compress(data[i:i + 1000]) for i in range(0, len(data), 1000) ]
+                self.assertEqual(codec.decompress("".join(pieces) + compressor.flush()), data, name)
+
+    def test_raw_deflate_response(self):
+        data = "".join(self.records(10))
+        compressor = zlib.compressobj(6, zlib.DEFLATED, -zlib.MAX_WBITS)
+        raw = compressor.compress(data) + compressor.flush()
+        self.assertEqual(compression_codecs["deflate"].decompress(raw), data)
+
+    def test_choose_codec(self):
+        db = self.make_client(compression=[(100, "deflate"), (10000, "gzip")])
+        self.assertEqual(db.choose_codec(99), None)
+        self.assertEqual(db.choose_codec(100).name, "deflate")
+        self.assertEqual(db.choose_codec(10000).name, "gzip")
+
+        db = self.make_client(compression="gzip", compression_threshold=50)
+        self.assertEqual(db.choose_codec(49), None)
+        self.assertEqual(db.choose_codec(50).name, "gzip")
+        self.assertRaises(AssertionError, self.make_client, compression="nope")
+
+    def test_request_bodies_are_compressed_from_the_threshold(self):
+        db = self.make_client(compression="gzip", compression_threshold=1024)
+        db.insert_records("t", self.records(2), None, {})
+        db.insert_records("t", self.records(500), None, {})
+
+        headers = [ request[1] for request in self.server.requests ]
+        self.assertFalse("content-encoding" in headers[0])
+        self.assertEqual(headers[1]["content-encoding"], "gzip")
+        self.assertTrue("gzip" in headers[1]["accept-encoding"])
+        self.assertEqual(len(self.store.tables["t"]), 502)
+
+        stats = db.get_compression_stats()
+        self.assertEqual(stats["requests_compressed"], 1)
+        self.assertEqual(stats["request_bytes"], self.server.requests[1][3])
+        self.assertTrue(stats["request_ratio"] > 1.0)
+
+    def test_body_that_does_not_shrink_is_sent_as_is(self):
+        db = self.make_client(compression="deflate", compression_threshold=1)
+        db.has_table("t")
+        self.assertFalse("content-encoding" in self.server.requests[0][1])
+        self.assertEqual(db.get_compression_stats()["requests_not_shrunk"], 1)
+
+    def test_no_compression_by_default(self):
+        db = self.make_client()
+        db.insert_records("t", self.records(500), None, {})
+        self.assertFalse("content-encoding" in self.server.requests[0][1])
+        self.assertEqual(self.server.requests[0][1].get("accept-encoding", "identity"), "identity")
+
+    def test_decompress_response(self):
+        db = self.make_client()
+        data = "".join(self.records(20))
+        self.assertEqual(db.decompress_response(None, data), data)
+        self.assertEqual(db.decompress_response(" identity ", data), data)
+        self.assertEqual(db.decompress_response("GZIP", compression_codecs["gzip"].compress(data)), data)
+        self.assertEqual(db.get_compression_stats()["response_bytes"], len(data))
+        self.assertRaises(GPUdbException, db.decompress_response, "br", data)
+
+# end class CompressionTest
+
+
+if __name__ == "__main__":
+    unittest.main()